@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+"""
+headless load test, starts the webrtc server in a child process and ramps N simulated viewers against /ws
+cpu and rss are sampled from the server process only, the viewers run in this one
+
+each viewer is a receiving webrtcbin speaking the same json sdp/ice protocol as the browser,
+everything stays on localhost, no browser and no stun server
+
+    python3 bench_viewers.py --steps 1,5,10,20 --hold 10 --test-source
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import typing
+
+import websockets
+
+import utils.gstapp as gstapp
+import webrtc_8filesrc as server
+from utils.gst import GLib, Gst, GstWebRTC
+from utils.logger import Logger, get_logger, load_package_logger
+
+
+def read_rss(pid: "int") -> "int":
+    """
+    resident set size of the process, bytes
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except BaseException:
+        pass
+    return 0
+
+
+def read_cpu_time(pid: "int") -> "float":
+    """
+    user + system time of the process, sec
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+    except BaseException:
+        return 0.0
+    # the command name may contain spaces, fields start after it
+    fields = stat[stat.rindex(")") + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class SimulatedViewer:
+    def __init__(self, url: "str", decode=False) -> None:
+        self.url = url
+        self.decode = decode
+
+        self.pipeline = gstapp.Pipeline()
+        self.webrtcbin = server.WebRTCBin()
+        # the server offers, the simulated viewer only answers
+        self.webrtcbin.on_negotiation_needed -= self.webrtcbin.create_offer
+        self.webrtcbin.on_set_local_description += self.on_set_local_description
+        self.webrtcbin.on_ice_candidate += self.on_ice_candidate
+        self.__pad_added_handler_id: "int" = None
+
+        self.websocket: "websockets.WebSocketClientProtocol" = None
+        self.event_loop: "asyncio.AbstractEventLoop" = None
+        self.task: "asyncio.Task" = None
+
+        self.frames = 0
+        self.connected_at: "float" = None
+        self.first_frame_at: "float" = None
+        self.packets_received = 0
+        self.packets_lost = 0
+
+        self._logger: "Logger" = None
+        self.logger = get_logger()
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @logger.setter
+    def logger(self, logger):
+        self._logger = logger
+        self.webrtcbin.logger = logger
+        self.pipeline.logger = logger
+
+    @property
+    def time_to_first_frame(self) -> "float":
+        if self.first_frame_at == None or self.connected_at == None:
+            return None
+        return self.first_frame_at - self.connected_at
+
+    def start(self, event_loop: "asyncio.AbstractEventLoop"):
+        self.event_loop = event_loop
+        self.pipeline.parse_launch("webrtcbin name=webrtcbin latency=0")
+        webrtcbin = self.pipeline.pipeline.get_by_name("webrtcbin")
+        self.__pad_added_handler_id = webrtcbin.connect("pad-added", self.__on_pad_added)
+        self.webrtcbin.start(webrtcbin)
+        self.pipeline.play()
+        self.task = event_loop.create_task(self.run())
+
+    def stop(self):
+        if self.task != None:
+            self.task.cancel()
+        self.task = None
+        self.webrtcbin.clear()
+        self.pipeline.stop()
+
+    async def run(self):
+        try:
+            async with websockets.connect(self.url) as websocket:
+                self.websocket = websocket
+                self.connected_at = time.monotonic()
+                async for message in websocket:
+                    self.handle(message)
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            self.logger.exception(e)
+        self.websocket = None
+
+    def send(self, _type: "str", data: "typing.Any"):
+        # called from webrtcbin threads
+        websocket = self.websocket
+        if websocket == None:
+            return
+        asyncio.run_coroutine_threadsafe(websocket.send(json.dumps({"type": _type, "data": data})), self.event_loop)
+
+    def handle(self, message: "str"):
+        message = json.loads(message)
+        _type = message.get("type", None)
+        data = message.get("data", None)
+        if _type == "sdp":
+            sdp = server.sdp_from_dict(data)
+            if sdp == None:
+                self.logger.warning(f"failed to handle sdp, {data}")
+                return
+            self.webrtcbin.set_remote_description(sdp)
+            self.webrtcbin.create_answer()
+        elif _type == "ice":
+            self.handle_ice(data)
+        elif _type == "ices":
+            for ice in data:
+                self.handle_ice(ice)
+
+    def handle_ice(self, data):
+        if data == None:
+            return
+        self.webrtcbin.add_ice_candidate(data["sdpMLineIndex"], data["candidate"])
+
+    def on_set_local_description(self, sdp: "GstWebRTC.WebRTCSessionDescription"):
+        self.send("sdp", server.sdp_to_dict(sdp))
+
+    def on_ice_candidate(self, sdpMLineIndex: "int", candidate: "str"):
+        self.send("ice", {"sdpMLineIndex": sdpMLineIndex, "candidate": candidate})
+
+    def __on_pad_added(self, webrtcbin: "Gst.Element", pad: "Gst.Pad", user_data=None):
+        if pad.direction != Gst.PadDirection.SRC:
+            return
+        pipe = "queue ! rtph264depay ! h264parse ! capsfilter caps=\"video/x-h264, alignment=au\" ! "
+        if self.decode:
+            pipe += "avdec_h264 ! "
+        pipe += "fakesink name=sink sync=false async=false"
+        self.logger.bin(pipe)
+        bin: "Gst.Bin" = Gst.parse_bin_from_description(pipe, True)
+        self.pipeline.pipeline.add(bin)
+        bin.sync_state_with_parent()
+        pad.link(bin.get_static_pad("sink"))
+        bin.get_by_name("sink").get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.__on_frame)
+
+    def __on_frame(self, pad: "Gst.Pad", info: "Gst.PadProbeInfo", user_data=None):
+        if self.first_frame_at == None:
+            self.first_frame_at = time.monotonic()
+        self.frames += 1
+        return Gst.PadProbeReturn.OK
+
+    async def update_stats(self):
+        if self.webrtcbin.webrtcbin == None:
+            return
+        future = self.event_loop.create_future()
+
+        def on_stats(stats: "dict"):
+            self.event_loop.call_soon_threadsafe(lambda: future.done() or future.set_result(stats))
+        self.webrtcbin.get_stats(on_stats)
+        try:
+            stats = await asyncio.wait_for(future, 2)
+        except asyncio.TimeoutError:
+            return
+        received = 0
+        lost = 0
+        for stat in stats.values():
+            if type(stat) == dict and stat.get("type", None) == GstWebRTC.WebRTCStatsType.INBOUND_RTP:
+                received += stat.get("packets-received", 0)
+                lost += max(stat.get("packets-lost", 0), 0)
+        self.packets_received = received
+        self.packets_lost = lost
+
+
+class Benchmark:
+    def __init__(self, url: "str", steps: "list[int]", hold: "float", decode=False, pid: "int" = None) -> None:
+        self.url = url
+        # server process, sampled for cpu/rss
+        self.pid = pid if pid != None else os.getpid()
+        self.steps = steps
+        self.hold = hold
+        self.decode = decode
+        self.viewers: "list[SimulatedViewer]" = []
+        self.results: "list[dict]" = []
+        self.logger = get_logger()
+
+    async def run(self):
+        event_loop = asyncio.get_event_loop()
+        for step in self.steps:
+            while len(self.viewers) < step:
+                viewer = SimulatedViewer(self.url, self.decode)
+                viewer.logger = self.logger.sub(f"viewer{len(self.viewers)}")
+                viewer.start(event_loop)
+                self.viewers.append(viewer)
+            self.results.append(await self.measure(step))
+        for viewer in self.viewers:
+            viewer.stop()
+        self.viewers.clear()
+
+    async def measure(self, step: "int") -> "dict":
+        frames = [viewer.frames for viewer in self.viewers]
+        cpu = read_cpu_time(self.pid)
+        start = time.monotonic()
+        await asyncio.sleep(self.hold)
+        elapsed = time.monotonic() - start
+        cpu = read_cpu_time(self.pid) - cpu
+        await asyncio.gather(*(viewer.update_stats() for viewer in self.viewers))
+
+        fps = [(viewer.frames - previous) / elapsed for viewer, previous in zip(self.viewers, frames)]
+        ttff = [viewer.time_to_first_frame for viewer in self.viewers if viewer.time_to_first_frame != None]
+        received = sum(viewer.packets_received for viewer in self.viewers)
+        lost = sum(viewer.packets_lost for viewer in self.viewers)
+        result = {
+            "viewers": step,
+            "fps_min": min(fps) if fps else 0,
+            "fps_avg": sum(fps) / len(fps) if fps else 0,
+            "ttff_avg": sum(ttff) / len(ttff) if ttff else None,
+            "ttff_max": max(ttff) if ttff else None,
+            "no_video": len(self.viewers) - len(ttff),
+            "cpu": 100 * cpu / elapsed,
+            "rss": read_rss(self.pid),
+            "loss": lost / (received + lost) if received + lost > 0 else 0,
+            "per_viewer": [
+                {
+                    "fps": viewer_fps,
+                    "ttff": viewer.time_to_first_frame,
+                    "packets_received": viewer.packets_received,
+                    "packets_lost": viewer.packets_lost,
+                }
+                for viewer, viewer_fps in zip(self.viewers, fps)
+            ],
+        }
+        ttff_avg = f"{result['ttff_avg'] * 1000:.0f}ms" if result["ttff_avg"] != None else "-"
+        self.logger.info(
+            f"viewers={step} fps(avg/min)={result['fps_avg']:.1f}/{result['fps_min']:.1f} ttff={ttff_avg} "
+            f"no_video={result['no_video']} cpu={result['cpu']:.0f}% rss={result['rss'] / (1 << 20):.0f}MiB loss={result['loss'] * 100:.2f}%"
+        )
+        return result
+
+
+def serve(port: "int", test_source: "bool"):
+    """
+    server process
+    """
+    load_package_logger(level=logging.INFO)
+
+    main_loop = GLib.MainLoop()
+    glib_thread = threading.Thread(target=lambda: main_loop.run(), daemon=True)
+    glib_thread.start()
+
+    app, camera_to_webrtc = server.create_app("bench_viewers", test_source=test_source)
+    app.run("127.0.0.1", port=port, single_process=True, access_log=False)
+    if camera_to_webrtc.camera != None:
+        camera_to_webrtc.camera.clear()
+
+
+async def wait_for_server(port: "int", process: "multiprocessing.Process", timeout: "float" = 30) -> "bool":
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.is_alive():
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            await asyncio.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ramp simulated webrtc viewers against a server in a child process")
+    parser.add_argument("--steps", default="1,5,10,20,30", help="viewer counts to ramp through")
+    parser.add_argument("--hold", type=float, default=10, help="seconds measured at each step")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8089)))
+    parser.add_argument("--decode", action="store_true", help="decode the received video (not counted in cpu/rss)")
+    parser.add_argument("--test-source", action="store_true", help="videotestsrc tiles instead of outputs/")
+    parser.add_argument("--output", default=None, help="write the results as json")
+    args = parser.parse_args()
+
+    logger = load_package_logger(level=logging.INFO)
+
+    # spawn, the child must not inherit this process' gstreamer and glib threads
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(args.port, args.test_source), daemon=True)
+    process.start()
+
+    main_loop = GLib.MainLoop()
+    glib_thread = threading.Thread(target=lambda: main_loop.run(), daemon=True)
+    glib_thread.start()
+
+    benchmark = Benchmark(f"ws://127.0.0.1:{args.port}/ws", [int(step) for step in args.steps.split(",")], args.hold, args.decode, process.pid)
+    benchmark.logger = logger.sub("bench")
+
+    async def run_benchmark():
+        if not await wait_for_server(args.port, process):
+            benchmark.logger.error("server did not start")
+            return
+        try:
+            await benchmark.run()
+        except BaseException as e:
+            benchmark.logger.exception(e)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(benchmark.results, f, indent=2)
+
+    try:
+        asyncio.run(run_benchmark())
+    finally:
+        process.terminate()
+        process.join(10)
+        main_loop.quit()
+
+
+if __name__ == "__main__":
+    main()
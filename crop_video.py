@@ -1,103 +1,108 @@
-import cv2
+#!/usr/bin/python3
+"""
+cuts a video into a rows x cols grid of image sequences, outputs/{row}{col}/frame{n}.png as read by webrtc_8filesrc.py
+
+frames are streamed with cv2.VideoCapture, tiles are numpy views of the frame, encoding runs in a process pool
+
+    python3 crop_video.py video.mp4 --rows 2 --cols 4 --format png --compression 1
+    python3 crop_video.py "photos/frame%d.png"
+"""
+import argparse
+import collections
+import concurrent.futures
 import os
-import sys
 import time
-import threading
-from glob import glob
-from pathlib import Path
-
-def add_level(root, folder_name):
-    new_level = os.path.join(root, folder_name) 
-    if not os.path.exists(new_level):
-        os.mkdir(new_level)
-    return new_level
-
-
-list = []
-
-files = glob('photos/*')
-for file in files:
-    list.append(file.replace('photos/',''))
-list.sort(key=lambda x : int((x.replace("frame",'').split('.')[0])))
-
-
-
-frameSize = (1920, 1080)
-b = 0
-
-
-### Split image to 8 peaces
-
-for ii in list:
-    image = cv2.imread(f"photos/{ii}")
-    if '/' in ii:
-        img_name = ii.rsplit('/', 1)[1].split('.')[0]
-    else:
-        img_name = ii.split('.')[0]
-
-
-    (h, w) = image.shape[:2]
-    (qX, qY) = (w // 4, h // 2)
-    indexX, indexY = 0,0
-    stopX, stopY = qX, qY
-    rows = 2
-    cols = 4
-    outputs_folder = add_level('./', 'outputs')
-    # img_folder = add_level(outputs_folder, img_name)
-    for i, row in enumerate(range(rows)):
-        indexX = 0
-        stopX = qX
-        for j, col in enumerate(range(cols)):
 
-            temp = add_level(outputs_folder, f'{i}{j}')
-            print(i,j,': ', indexX, indexY, ':', stopX, stopY)
-            slice = image[indexY:stopY, indexX:stopX, :]
-            cv2.imwrite(f"{temp}/{img_name}.png",slice)
-            indexX += qX
-            stopX+=qX
-            # print(row*cols + col)
-        print('*')
-        indexY += qY
-        stopY += qY
-
-
-### Split image to 4 peaces
-
-# cv2.imshow('img', image)
-# cv2.waitKey(0)
-# print(list)
-# for i in list:
-#     image = cv2.imread(f"photos/{i}")
-#     (h, w) = image.shape[:2]
-#     (cX, cY) = (w // 2, h // 2)
-#     b += 1
-    # topLeft = image[0:cY, 0:cX]
-    # topRight = image[0:cY, cX:w]
-    # bottomLeft = image[cY:h, 0:cX]
-    # bottomRight = image[cY:h, cX:w]
-
-
-#     cv2.imwrite(f"top_left/topLeft{b}.png",topLeft)
-#     cv2.imwrite(f"top_right/topRight{b}.png",topRight)
-#     cv2.imwrite(f"bottom_left/bottomLeft{b}.png",bottomLeft)
-#     cv2.imwrite(f"bottom_right/bottomRight{b}.png",bottomRight)
-# cv2.waitKey(0)
-
-
-
-
-# def create_video():
-#     out1 = cv2.VideoWriter('left_top_video.mp4',cv2.VideoWriter_fourcc(*'DIVX'), 60, frameSize)
-#     out2 = cv2.VideoWriter('right_top_video.mp4',cv2.VideoWriter_fourcc(*'DIVX'), 60, frameSize)
-#     out3 = cv2.VideoWriter('buttom_left_video.mp4',cv2.VideoWriter_fourcc(*'DIVX'), 60, frameSize)
-#     out4 = cv2.VideoWriter('buttom_right_video.mp4',cv2.VideoWriter_fourcc(*'DIVX'), 60, frameSize)
-
-#     for i in list:
-#         image = cv2.imread(f"images/{i}")
-#         out1.write(image)
-#         out2.write(image)
-#         out3.write(image)
-#         out4.write(image)
-
-
-#     out1.release()
+import cv2
+import numpy as np
+
+FORMATS = {
+    # extension: (imwrite flag, default level, valid levels)
+    "png": (cv2.IMWRITE_PNG_COMPRESSION, 3, range(0, 10)),
+    "jpg": (cv2.IMWRITE_JPEG_QUALITY, 95, range(0, 101)),
+    "webp": (cv2.IMWRITE_WEBP_QUALITY, 95, range(1, 101)),
+}
+
+
+def tile_folders(output: "str", rows: "int", cols: "int") -> "list[str]":
+    folders = []
+    for row in range(rows):
+        for col in range(cols):
+            folder = os.path.join(output, f"{row}{col}")
+            os.makedirs(folder, exist_ok=True)
+            folders.append(folder)
+    return folders
+
+
+def write_tiles(frame: "np.ndarray", index: "int", folders: "list[str]", rows: "int", cols: "int", extension: "str", params: "list[int]") -> "int":
+    """
+    runs in a worker, the tiles are views of frame, only the encoder reads them
+    """
+    (h, w) = frame.shape[:2]
+    (qX, qY) = (w // cols, h // rows)
+    for row in range(rows):
+        for col in range(cols):
+            tile = frame[row * qY:(row + 1) * qY, col * qX:(col + 1) * qX]
+            if not cv2.imwrite(os.path.join(folders[row * cols + col], f"frame{index}.{extension}"), tile, params):
+                raise RuntimeError(f"failed to write frame {index} tile {row}{col}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cut a video into a grid of image sequences")
+    parser.add_argument("input", help="video file, or an image sequence pattern such as photos/frame%%d.png")
+    parser.add_argument("--output", default="outputs", help="root folder of the tile sequences")
+    parser.add_argument("--rows", type=int, default=2)
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--format", default="png", choices=sorted(FORMATS), help="webrtc_8filesrc.py reads png")
+    parser.add_argument("--compression", type=int, default=None, help="png compression 0-9, jpg/webp quality")
+    parser.add_argument("--start-index", type=int, default=1, help="number of the first frame, multifilesrc index")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--report", type=float, default=2.0, help="seconds between progress reports")
+    args = parser.parse_args()
+
+    flag, level, levels = FORMATS[args.format]
+    if args.compression != None:
+        level = args.compression
+    if level not in levels:
+        parser.error(f"--compression {level} out of range for {args.format}, {levels.start}-{levels.stop - 1}")
+    params = [flag, level]
+
+    capture = cv2.VideoCapture(args.input)
+    if not capture.isOpened():
+        parser.error(f"failed to open {args.input}")
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    folders = tile_folders(args.output, args.rows, args.cols)
+
+    # frames in flight, bounds the memory while the workers encode
+    max_pending = 2 * args.workers
+    pending: "collections.deque[concurrent.futures.Future]" = collections.deque()
+    index = args.start_index
+    done = 0
+    start = time.monotonic()
+    reported = start
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            pending.append(executor.submit(write_tiles, frame, index, folders, args.rows, args.cols, args.format, params))
+            index += 1
+            while len(pending) >= max_pending or (len(pending) > 0 and pending[0].done()):
+                pending.popleft().result()
+                done += 1
+            now = time.monotonic()
+            if now - reported >= args.report:
+                reported = now
+                progress = f"{done}/{total}" if total > 0 else f"{done}"
+                print(f"{progress} frames, {done / (now - start):.1f} fps")
+        while len(pending) > 0:
+            pending.popleft().result()
+            done += 1
+    capture.release()
+    elapsed = time.monotonic() - start
+    print(f"{done} frames, {done * args.rows * args.cols} tiles in {elapsed:.1f}s, {done / elapsed if elapsed > 0 else 0:.1f} fps")
+
+
+if __name__ == "__main__":
+    main()
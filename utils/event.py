@@ -1,3 +1,5 @@
+import threading
+import time
 import typing
 T = typing.TypeVar("T")
 
@@ -8,6 +10,9 @@ class Event(typing.Generic[T]):
         def __init__(self, f: T, is_new=True) -> None:
             self.f = f
             self.is_new = is_new
+            # timing mode
+            self.calls = 0
+            self.time = 0  # ns
 
         def __eq__(self, f: object) -> bool:
             return self.f.__eq__(f)
@@ -16,10 +21,20 @@ class Event(typing.Generic[T]):
             self.is_new = False
             return self.f(*a, **kw)
 
+        @property
+        def name(self) -> "str":
+            return getattr(self.f, "__qualname__", repr(self.f))
+
     def __init__(self, name):
         self.targets: "list[self._Target(T)]" = []
         self.__name__ = name
 
+        # dispatch snapshot, rebuilt only when the handlers change
+        self.__lock = threading.Lock()
+        self.__snapshot: "tuple[T]" = ()
+        self.__has_new = False
+        self.__timing = False
+
     def __del__(self):
         self.clear()
 
@@ -28,13 +43,64 @@ class Event(typing.Generic[T]):
         return f"Event(\"{self.__name__}\")"
 
     def __call__(self, *a, **kw):
+        if self.__has_new or self.__timing:
+            return self.__call_slow(*a, **kw)
+        ret = None
+        for f in self.__snapshot:
+            ret = f(*a, **kw)
+        return ret
+
+    def __call_slow(self, *a, **kw):
+        if self.__has_new:
+            # every handler is called from here on, none is new anymore
+            self.__has_new = False
+            for target in tuple(self.targets):
+                target.is_new = False
+        if not self.__timing:
+            return self(*a, **kw)
         ret = None
         for target in tuple(self.targets):
-            ret = target(*a, **kw)
-        # for i in range(len(self.targets)):
-        #     ret = self.targets[i](*a, **kw)
+            start = time.perf_counter_ns()
+            try:
+                ret = target.f(*a, **kw)
+            finally:
+                target.time += time.perf_counter_ns() - start
+                target.calls += 1
         return ret
 
+    def __update(self):
+        # called with the lock held
+        self.__snapshot = tuple(target.f for target in self.targets)
+        self.__has_new = any(target.is_new for target in self.targets)
+
+    def enable_timing(self):
+        """
+        counts calls and cumulative time per handler, see stats()
+        """
+        for target in tuple(self.targets):
+            target.calls = 0
+            target.time = 0
+        self.__timing = True
+
+    def disable_timing(self):
+        self.__timing = False
+
+    def stats(self) -> "list[dict]":
+        """
+        per handler calls and time in sec, most expensive first
+        """
+        stats = [
+            {
+                "handler": target.name,
+                "calls": target.calls,
+                "time": target.time / 1e9,
+                "mean": target.time / target.calls / 1e9 if target.calls > 0 else 0.0,
+            }
+            for target in tuple(self.targets)
+        ]
+        stats.sort(key=lambda stat: stat["time"], reverse=True)
+        return stats
+
     def get_new(self):
         return tuple(target for target in self.targets if target.is_new)
 
@@ -65,13 +131,25 @@ class Event(typing.Generic[T]):
         return True
 
     def append(self, f: "T", is_new=True):
-        return self.targets.append(self._Target(f, is_new))
+        with self.__lock:
+            ret = self.targets.append(self._Target(f, is_new))
+            self.__update()
+        return ret
 
     def insert(self, index: int, f: "T", is_new=True):
-        return self.targets.insert(index, self._Target(f, is_new))
+        with self.__lock:
+            ret = self.targets.insert(index, self._Target(f, is_new))
+            self.__update()
+        return ret
 
     def remove(self, f: "T"):
-        return self.targets.remove(f)
+        with self.__lock:
+            ret = self.targets.remove(f)
+            self.__update()
+        return ret
 
     def clear(self):
-        return self.targets.clear()
+        with self.__lock:
+            ret = self.targets.clear()
+            self.__update()
+        return ret
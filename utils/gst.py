@@ -1,4 +1,5 @@
 import gi
+import os
 import sys
 gi.require_version('GLib', '2.0')
 gi.require_version('Gst', '1.0')
@@ -15,6 +16,16 @@ try:
     from gi.repository import GstSdp
 except:
     pass
+try:
+    gi.require_version('GstVideo', '1.0')
+    from gi.repository import GstVideo
+except:
+    pass
+try:
+    gi.require_version('GstAllocators', '1.0')
+    from gi.repository import GstAllocators
+except:
+    pass
 try:
     gi.require_version('GstRtspServer', '1.0')
     from gi.repository import GstRtspServer
@@ -22,4 +33,24 @@ except:
     pass
 
 
+# tracers read by utils.tracers.TracerStats, WEBRTC_TRACERS=1 for the defaults or a GST_TRACERS list,
+# set before Gst.init, GStreamer reads them once
+DEFAULT_TRACERS = "latency(flags=element);proctime;queuelevel"
+TRACERS = os.environ.get("WEBRTC_TRACERS", "")
+# read end of the pipe the default log function writes to, None when GST_DEBUG_FILE is the user's
+TRACER_FD: "int" = None
+if TRACERS != "":
+    os.environ["GST_TRACERS"] = DEFAULT_TRACERS if TRACERS == "1" else TRACERS
+    _debug = os.environ.get("GST_DEBUG", "")
+    os.environ["GST_DEBUG"] = f"{_debug},GST_TRACER:7" if _debug != "" else "GST_TRACER:7"
+    if os.environ.get("GST_DEBUG_FILE", "") == "":
+        # the streaming threads only write a line, TracerStats parses them on its own thread
+        TRACER_FD, _write_fd = os.pipe()
+        os.environ["GST_DEBUG_FILE"] = f"/dev/fd/{_write_fd}"
+        os.environ["GST_DEBUG_NO_COLOR"] = "1"
+
 Gst.init(sys.argv)
+
+if TRACER_FD != None:
+    # off until TracerStats.start drains the pipe, a full pipe blocks the streaming threads
+    Gst.debug_set_threshold_for_name("GST_TRACER", Gst.DebugLevel.NONE)
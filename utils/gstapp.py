@@ -1,14 +1,29 @@
 from re import A
 import typing
 from .gst import Gst, GLib
+try:
+    from .gst import GstVideo
+except ImportError:
+    GstVideo = None
+try:
+    from .gst import GstAllocators
+except ImportError:
+    GstAllocators = None
+import collections
 import math
+import mmap
 import os
+import struct
+import tempfile
+import threading
+import time
+import weakref
 import numpy as np
 import json
 from .logger import get_logger, Logger
 
 
-from .ringbuffer import RingBuffer
+from .ringbuffer import RingBuffer, ByteRingBuffer
 from .event import Event
 
 T = typing.TypeVar("T")
@@ -101,7 +116,46 @@ class Pipe:
             return Pipe.split_end(self.tee, *branches, indent=self.indent, queue=self.queue)
 
 
+class QosStats:
+    """
+    qos messages of one element, aggregated from the bus sync handler, times in ns
+    """
+
+    def __init__(self) -> None:
+        self.messages = 0
+        # the element's own totals, from the last message
+        self.processed = 0
+        self.dropped = 0
+        self.jitter = 0
+        self.max_jitter = 0
+        self.proportion = 1.0
+
+    def update(self, message: "Gst.Message"):
+        self.messages += 1
+        jitter, proportion, quality = message.parse_qos_values()
+        _format, processed, dropped = message.parse_qos_stats()
+        self.jitter = jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.proportion = proportion
+        if _format == Gst.Format.BUFFERS:
+            self.processed = processed
+            self.dropped = dropped
+
+    def as_dict(self) -> "dict":
+        return {
+            "messages": self.messages,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "jitter": self.jitter,
+            "max_jitter": self.max_jitter,
+            "proportion": self.proportion,
+        }
+
+
 class Pipeline:
+    # enable_sync_bus default filter, the only messages that reach the main loop
+    SYNC_BUS_TYPES = Gst.MessageType.EOS | Gst.MessageType.ERROR | Gst.MessageType.WARNING | Gst.MessageType.STATE_CHANGED
+
     def __init__(self, pipeline: "Gst.Pipeline" = None):
         self.pipeline: "Gst.Pipeline" = None
         self.on_bus: "Event[typing.Callable[[Gst.Message],]]" = Event("on_bus")
@@ -113,6 +167,12 @@ class Pipeline:
         self.__bus_handle_id = None
         self.__bus: "Gst.Bus" = None
 
+        # sync bus
+        self.__sync_bus_enabled = False
+        self.__sync_bus_types: "Gst.MessageType" = self.SYNC_BUS_TYPES
+        self.__qos: "dict[str, QosStats]" = {}
+        self.__qos_lock = threading.Lock()
+
         self.__is_owner = False
 
         self.enable_default()
@@ -159,14 +219,37 @@ class Pipeline:
             if self.__bus_handle_id:
                 self.__bus.disconnect(self.__bus_handle_id)
             self.__bus.remove_signal_watch()
+            self.__bus.set_sync_handler(None)
         self.__bus_handle_id = None
         self.__bus = None
+        with self.__qos_lock:
+            self.__qos = {}
 
     def __start_bus(self):
         self.__bus: "Gst.Bus" = self.pipeline.get_bus()
+        if self.__sync_bus_enabled:
+            self.__bus.set_sync_handler(self.__on_bus_sync_message)
         self.__bus.add_signal_watch()
         self.__bus_handle_id = self.__bus.connect("message", self.__on_bus_message)
 
+    def __on_bus_sync_message(self, bus: "Gst.Bus", message: "Gst.Message", user_data=None):
+        # streaming threads, decides which messages are queued for the main loop
+        t = message.type
+        if t == Gst.MessageType.QOS:
+            src = message.src
+            name = src.get_name() if src != None else ""
+            with self.__qos_lock:
+                qos = self.__qos.get(name, None)
+                if qos == None:
+                    qos = self.__qos[name] = QosStats()
+                qos.update(message)
+            return Gst.BusSyncReply.DROP
+        if not t & self.__sync_bus_types:
+            return Gst.BusSyncReply.DROP
+        if t == Gst.MessageType.STATE_CHANGED and message.src != self.pipeline:
+            return Gst.BusSyncReply.DROP
+        return Gst.BusSyncReply.PASS
+
     def __disown(self):
         # logger.error("disown")
         bus: "Gst.Bus" = self.pipeline.get_bus()
@@ -211,6 +294,26 @@ class Pipeline:
         except:
             pass
 
+    @property
+    def qos(self) -> "dict[str, QosStats]":
+        """
+        per element qos, only kept with enable_sync_bus
+        """
+        with self.__qos_lock:
+            return dict(self.__qos)
+
+    def disable_sync_bus(self):
+        self.__sync_bus_enabled = False
+
+    def enable_sync_bus(self, types: "Gst.MessageType" = SYNC_BUS_TYPES):
+        """
+        filters the bus from a sync handler in the streaming threads, the main loop and on_bus only see
+        messages of types, state changes of the top level pipeline only, qos is aggregated into qos
+        takes effect from the next start
+        """
+        self.__sync_bus_enabled = True
+        self.__sync_bus_types = types
+
     def enable_default(self):
         self.disable_default()
         self.on_eos += self.__default_on_eos
@@ -251,6 +354,47 @@ def parse_launch(pipeline_description, logger=get_logger()):
     return pipeline
 
 
+def structure_to_dict(structure: "Gst.Structure") -> "dict":
+    ret = {}
+    for i in range(structure.n_fields()):
+        name = structure.nth_field_name(i)
+        value = structure.get_value(name)
+        if isinstance(value, Gst.Structure):
+            value = structure_to_dict(value)
+        ret[name] = value
+    return ret
+
+
+def sample_size(sample: "Gst.Sample") -> "int":
+    return sample.get_buffer().get_size()
+
+
+def sample_pts(sample: "Gst.Sample") -> "int":
+    pts = sample.get_buffer().pts
+    return pts if pts != Gst.CLOCK_TIME_NONE else 0
+
+
+def get_running_time(element: "Gst.Element") -> "int":
+    """
+    current running time of the pipeline holding element, 0 before it has a clock
+    """
+    pipeline: "Gst.Element" = element
+    while pipeline != None and pipeline.parent != None:
+        pipeline = pipeline.parent
+    clock: "Gst.Clock" = pipeline.get_clock() if pipeline != None else None
+    if clock == None:
+        return 0
+    return max(clock.get_time() - pipeline.get_base_time(), 0)
+
+
+def force_key_unit_event(all_headers=True) -> "Gst.Event":
+    # same structure as gst_video_event_new_upstream_force_key_unit, without requiring GstVideo
+    st = Gst.Structure.new_from_string(
+        f"GstForceKeyUnit, running-time=(guint64){Gst.CLOCK_TIME_NONE}, all-headers=(boolean){'true' if all_headers else 'false'}, count=(uint)0"
+    )
+    return Gst.Event.new_custom(Gst.EventType.CUSTOM_UPSTREAM, st)
+
+
 class Timeout:
     def __init__(self) -> None:
         self.__timeout: "GLib.Source" = None
@@ -321,9 +465,152 @@ class RestartTimeout:
         self.__timeout.attach()
 
 
-class DataCheck:
-    def __init__(self, interval: "int"):
+class Watchdog:
+    """
+    one timer for many DataCheck, checks sit in a wheel slot by deadline and feed only stamps the time,
+    a check is moved to a later slot when its slot comes up and it was fed meanwhile
+    """
+
+    def __init__(self, tick: "int" = 100, slots: "int" = 64):
+        """
+        tick - ms, resolution of the deadlines
+        slots - wheel size, longer deadlines wait for more turns of the wheel
+        """
+        self.logger = get_logger()
+        self.tick = tick
+        self.__slots: "list[set[DataCheck]]" = [set() for _ in range(slots)]
+        self.__lock = threading.Lock()
         self.__timeout: "GLib.Source" = None
+        self.__origin = time.monotonic()
+        # last processed tick
+        self.__position = 0
+        self.__armed = 0
+        # bumped per timer, a tick of a replaced timer ends it
+        self.__generation = 0
+
+    def __del__(self):
+        # self.logger.warning("del Watchdog")
+        self.clear()
+
+    @property
+    def armed(self) -> "int":
+        return self.__armed
+
+    def clear(self):
+        with self.__lock:
+            self.__stop()
+            for slot in self.__slots:
+                for check in slot:
+                    check._armed = False
+                slot.clear()
+            self.__armed = 0
+
+    def __stop(self):
+        if self.__timeout:
+            self.__timeout.destroy()
+        self.__timeout = None
+
+    def __start(self):
+        self.__position = self.__tick_of(time.monotonic())
+        self.__generation += 1
+        self.__timeout = GLib.timeout_source_new(self.tick)
+        self.__timeout.set_callback(self.__on_tick, self.__generation)
+        self.__timeout.attach()
+
+    def __tick_of(self, t: "float") -> "int":
+        return int((t - self.__origin) * 1000 / self.tick)
+
+    def __schedule(self, check: "DataCheck", current: "int"):
+        # first tick at or after the deadline, never the slot being processed
+        deadline = check._last + check.interval / 1000
+        check._deadline = max(-(-int((deadline - self.__origin) * 1000) // self.tick), current + 1)
+        self.__slots[check._deadline % len(self.__slots)].add(check)
+
+    def arm(self, check: "DataCheck") -> "bool":
+        """
+        returns whether the check goes from no data to data, has_data only changes under the lock
+        """
+        with self.__lock:
+            if check._armed:
+                return False
+            check._armed = True
+            self.__armed += 1
+            if self.__timeout == None:
+                self.__start()
+            self.__schedule(check, self.__position)
+            # fed again before its on_data_stop went out, the stop is cancelled and no start is due
+            started = not check.has_data and not check._stopping
+            check._stopping = False
+            check.has_data = True
+            return started
+
+    def disarm(self, check: "DataCheck"):
+        with self.__lock:
+            if not check._armed:
+                return
+            check._armed = False
+            self.__armed -= 1
+            self.__slots[check._deadline % len(self.__slots)].discard(check)
+
+    def __on_tick(self, generation: "int"):
+        now = time.monotonic()
+        expired: "list[DataCheck]" = []
+        with self.__lock:
+            if self.__timeout == None or generation != self.__generation:
+                # stopped, or replaced by a timer started from arm()
+                return False
+            current = self.__tick_of(now)
+            # catches up when the main loop was late, at most one turn of the wheel
+            first = max(self.__position + 1, current - len(self.__slots) + 1)
+            for position in range(first, current + 1):
+                slot = self.__slots[position % len(self.__slots)]
+                for check in tuple(slot):
+                    if check._deadline > current:
+                        # a later turn of the wheel
+                        continue
+                    slot.discard(check)
+                    if now - check._last < check.interval / 1000:
+                        # fed since it was scheduled
+                        self.__schedule(check, current)
+                    else:
+                        check._armed = False
+                        check.has_data = False
+                        check._stopping = True
+                        self.__armed -= 1
+                        expired.append(check)
+            self.__position = current
+            # decided under the lock, an arm() right after starts its own timer
+            keep = self.__armed > 0
+            if not keep:
+                self.__timeout = None
+        for check in expired:
+            with self.__lock:
+                if not check._stopping:
+                    # cancelled by a feed meanwhile
+                    continue
+                check._stopping = False
+            try:
+                check._expire()
+            except BaseException as e:
+                self.logger.exception(e)
+        return keep
+
+
+_watchdog: "Watchdog" = None
+
+
+def get_watchdog() -> "Watchdog":
+    """
+    watchdog shared by every DataCheck that is not given its own
+    """
+    global _watchdog
+    if _watchdog == None:
+        _watchdog = Watchdog()
+    return _watchdog
+
+
+class DataCheck:
+    def __init__(self, interval: "int", watchdog: "Watchdog" = None):
         self.logger = get_logger()
 
         self.has_data = False
@@ -331,6 +618,13 @@ class DataCheck:
         self.on_data_stop: "Event[typing.Callable[[],]]" = Event("on_data_stop")
         self.interval = interval
 
+        # kept by the watchdog
+        self.__watchdog = watchdog if watchdog != None else get_watchdog()
+        self._armed = False
+        self._stopping = False
+        self._deadline = 0
+        self._last = 0.0
+
     def __del__(self):
         # self.logger.warning("del DataCheck")
         self.clear()
@@ -341,24 +635,18 @@ class DataCheck:
         self.on_data_stop.clear()
 
     def stop(self):
-        if self.__timeout:
-            self.__timeout.destroy()
-        self.__timeout = None
+        self.__watchdog.disarm(self)
 
     def feed(self):
-        self.stop()
-        had_data = self.has_data
-        if not had_data:
+        self._last = time.monotonic()
+        if self._armed:
+            return
+        if self.__watchdog.arm(self):
             self.on_data_start()
-        self.has_data = True
-        self.__timeout = GLib.timeout_source_new(self.interval)
 
-        def _mark_no_data(user_data=None):
-            self.has_data = False
-            self.on_data_stop()
-            return False
-        self.__timeout.set_callback(_mark_no_data)
-        self.__timeout.attach()
+    def _expire(self):
+        # has_data was cleared by the watchdog
+        self.on_data_stop()
 
 
 class Object:
@@ -445,8 +733,156 @@ class AppSrc():
     def push_buffer(self, buffer: "Gst.Buffer"):
         return self.appsrc.emit("push-buffer", buffer)
 
+    def push_buffer_list(self, buffer_list: "Gst.BufferList"):
+        return self.appsrc.emit("push-buffer-list", buffer_list)
+
+
+H264_NAL_IDR = 5
+H264_NAL_SPS = 7
+H264_NAL_PPS = 8
+H264_NAL_STAP_A = 24
+H264_NAL_FU_A = 28
+
+
+def rtp_h264_nal_types(buffer: "Gst.Buffer") -> "list[int]":
+    """
+    nal unit types starting in a h264 rtp packet (rfc 6184),
+    fragmentation units only report their first fragment
+    """
+    # only the headers are copied out, never the payload
+    size = buffer.get_size()
+    if size < 13:
+        return []
+    header: "bytes" = buffer.extract_dup(0, 12)
+    offset = 12 + 4 * (header[0] & 0x0F)
+    if header[0] & 0x10:  # header extension
+        if size < offset + 4:
+            return []
+        extension: "bytes" = buffer.extract_dup(offset, 4)
+        offset += 4 + 4 * ((extension[2] << 8) | extension[3])
+    end = size
+    if header[0] & 0x20:  # padding
+        end -= buffer.extract_dup(size - 1, 1)[0]
+    if end <= offset:
+        return []
+    nal: "bytes" = buffer.extract_dup(offset, min(2, end - offset))
+    nal_type = nal[0] & 0x1F
+    if nal_type == H264_NAL_STAP_A:
+        types = []
+        i = offset + 1
+        while i + 2 < end:
+            unit: "bytes" = buffer.extract_dup(i, 3)
+            types.append(unit[2] & 0x1F)
+            i += 2 + ((unit[0] << 8) | unit[1])
+        return types
+    if nal_type == H264_NAL_FU_A:
+        if len(nal) > 1 and nal[1] & 0x80:
+            return [nal[1] & 0x1F]
+        return []
+    return [nal_type]
+
+
+class GopCache:
+    """
+    keeps the most recent key frame, its parameter sets and every packet after it,
+    so a late joiner can be primed with a decodable GOP
+    """
+    DELTA = 0
+    PARAMETER = 1
+    KEY = 2
+
+    @staticmethod
+    def rtp_h264_classify(buffer: "Gst.Buffer") -> "int":
+        types = rtp_h264_nal_types(buffer)
+        if H264_NAL_IDR in types:
+            return GopCache.KEY
+        if H264_NAL_SPS in types or H264_NAL_PPS in types:
+            return GopCache.PARAMETER
+        return GopCache.DELTA
+
+    @staticmethod
+    def delta_unit_classify(buffer: "Gst.Buffer") -> "int":
+        # for parsed, au aligned streams where the parser sets DELTA_UNIT
+        if buffer.has_flags(Gst.BufferFlags.DELTA_UNIT):
+            return GopCache.DELTA
+        return GopCache.KEY
+
+    def __init__(self, max_bytes: "int", classify: "typing.Callable[[Gst.Buffer], int]" = None) -> None:
+        self.max_bytes = max_bytes
+        self.classify = classify if classify != None else GopCache.rtp_h264_classify
+        self.samples: "list[Gst.Sample]" = []
+        self.bytes = 0
+        self.overflows = 0
+
+        self.__key_pts = None
+        self.__parameters: "list[Gst.Sample]" = []
+        self.__pending: "list[Gst.Sample]" = []
+        self.__pending_bytes = 0
+
+    def __iter__(self):
+        return iter(tuple(self.samples))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def clear(self):
+        self.samples = []
+        self.bytes = 0
+        self.__key_pts = None
+        self.__parameters = []
+        self.__pending = []
+        self.__pending_bytes = 0
+
+    def push(self, sample: "Gst.Sample"):
+        buffer: "Gst.Buffer" = sample.get_buffer()
+        size = buffer.get_size()
+        kind = self.classify(buffer)
+        if kind == GopCache.PARAMETER:
+            self.__pending.append(sample)
+            self.__pending_bytes += size
+            return
+        if kind == GopCache.KEY and buffer.pts != self.__key_pts:
+            # new key frame, multi slice key frames share the pts
+            if len(self.__pending) > 0:
+                self.__parameters = self.__pending
+                samples = self.__pending
+                size += self.__pending_bytes
+            else:
+                samples = list(self.__parameters)
+                size += sum(_sample.get_buffer().get_size() for _sample in samples)
+            samples.append(sample)
+            self.samples = samples
+            self.bytes = size
+            self.__key_pts = buffer.pts
+            self.__pending = []
+            self.__pending_bytes = 0
+            return
+        if self.__key_pts == None:
+            # waiting for a key frame
+            self.__pending = []
+            self.__pending_bytes = 0
+            return
+        if len(self.__pending) > 0:
+            self.samples += self.__pending
+            self.bytes += self.__pending_bytes
+            self.__pending = []
+            self.__pending_bytes = 0
+        self.samples.append(sample)
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            # an incomplete GOP is useless to a new viewer, wait for the next key frame
+            self.overflows += 1
+            self.samples = []
+            self.bytes = 0
+            self.__key_pts = None
+
 
 class AppSink:
+    # enable_auto_pull_thread overflow policies
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+    BLOCK = "block"
+
     def __init__(self, appsink: "Gst.Element" = None) -> None:
         self.appsink: "Gst.Element" = None
         self.on_new_sample: "Event[typing.Callable[[self],Gst.FlowReturn]]" = Event("on_new_sample")
@@ -458,6 +894,17 @@ class AppSink:
         self.__on_pulled_sample_modify_dts_pts: "typing.Callable[[Gst.Sample],]" = None
 
         self.last_sample: "Gst.Sample" = None
+        self.gop_cache: "GopCache" = None
+
+        # threaded pull
+        self.__queue: "collections.deque[Gst.Sample]" = None
+        self.__queue_condition = threading.Condition()
+        self.__queue_thread: "threading.Thread" = None
+        self.__queue_running = False
+        self.queue_max_size = 0
+        self.queue_policy = AppSink.DROP_OLDEST
+        self.dropped = 0
+        self.max_depth = 0
 
         if appsink != None:
             self.start(appsink)
@@ -469,9 +916,7 @@ class AppSink:
         # self.logger.warning("del AppSink", stacklevel=2)
 
     def clear(self):
-        self.disable_auto_pull()
-        self.disable_auto_pull_ring()
-        self.disable_const_pull()
+        self.__disable_auto_pull_modes()
         self.disable_clear_dts_pts()
         self.on_new_sample.clear()
         self.on_pulled_sample.clear()
@@ -485,6 +930,12 @@ class AppSink:
         if self.__on_new_sample_timeout != None:
             self.__on_new_sample_timeout.destroy()
         self.__on_new_sample_timeout = None
+        if self.gop_cache != None:
+            self.gop_cache.clear()
+        with self.__queue_condition:
+            if self.__queue != None:
+                self.__queue.clear()
+            self.__queue_condition.notify_all()
         self.appsink = None
 
     def start(self, appsink: "Gst.Element"):
@@ -547,13 +998,22 @@ class AppSink:
         self.__on_pulled_sample_modify_dts_pts = __on_pulled_sample_const_duration
         self.on_pulled_sample.insert(0, self.__on_pulled_sample_modify_dts_pts, False)
 
+    def __disable_auto_pull_modes(self):
+        # the modes share on_new_sample, enabling one turns every other off,
+        # the worker thread and the const pull timeout included
+        self.disable_auto_pull()
+        self.disable_auto_pull_ring()
+        self.disable_auto_pull_gop()
+        self.disable_auto_pull_thread()
+        self.disable_const_pull()
+
     def disable_auto_pull(self):
         if self.__on_new_sample_pull:
             self.on_new_sample -= self.__on_new_sample_pull
         self.__on_new_sample_pull = None
 
     def enable_auto_pull(self, timeout=Gst.USECOND):
-        self.disable_auto_pull()
+        self.__disable_auto_pull_modes()
 
         def __on_new_sample_pull(_self):
             # self.logger.debug("auto pull")
@@ -567,9 +1027,15 @@ class AppSink:
             self.on_new_sample -= self.__on_new_sample_pull
         self.__on_new_sample_pull = None
 
-    def enable_auto_pull_ring(self, size: "int", timeout=Gst.USECOND):
-        self.disable_auto_pull_ring()
-        ring: "RingBuffer[Gst.Sample]" = RingBuffer(size)
+    def enable_auto_pull_ring(self, size: "int", timeout=Gst.USECOND, max_bytes: "int" = 0):
+        """
+        max_bytes - bound the ring by the buffer bytes instead, size is then the most samples it keeps
+        """
+        self.__disable_auto_pull_modes()
+        if max_bytes > 0:
+            ring: "ByteRingBuffer[Gst.Sample]" = ByteRingBuffer(max_bytes, sample_size, sample_pts, max_items=size)
+        else:
+            ring: "RingBuffer[Gst.Sample]" = RingBuffer(size)
 
         def __on_new_sample_pull(_self):
             sample = self._try_pull_sample(timeout)
@@ -588,6 +1054,114 @@ class AppSink:
         self.__on_new_sample_pull = __on_new_sample_pull
         self.on_new_sample += self.__on_new_sample_pull
 
+    def disable_auto_pull_gop(self):
+        if self.__on_new_sample_pull:
+            self.on_new_sample -= self.__on_new_sample_pull
+        self.__on_new_sample_pull = None
+        self.gop_cache = None
+
+    def enable_auto_pull_gop(self, max_bytes: "int", classify: "typing.Callable[[Gst.Buffer], int]" = None, timeout=Gst.USECOND):
+        """
+        like enable_auto_pull_ring, but new on_pulled_sample handlers are primed with
+        the last key frame and everything after it instead of the last N samples
+        """
+        self.__disable_auto_pull_modes()
+        cache = GopCache(max_bytes, classify)
+        self.gop_cache = cache
+
+        def __on_new_sample_pull(_self):
+            sample = self._try_pull_sample(timeout)
+            self.last_sample = sample
+            if sample == None:
+                return Gst.FlowReturn.OK
+            new_on_pulled_sample = self.on_pulled_sample.get_new()
+            if len(new_on_pulled_sample) > 0:
+                samples = tuple(cache)
+                for on_pulled_sample in new_on_pulled_sample:
+                    for _sample in samples:
+                        on_pulled_sample(_sample)
+            cache.push(sample)
+            self.on_pulled_sample(sample)
+            return Gst.FlowReturn.OK
+        self.__on_new_sample_pull = __on_new_sample_pull
+        self.on_new_sample += self.__on_new_sample_pull
+
+    @property
+    def queue_depth(self) -> "int":
+        queue = self.__queue
+        return len(queue) if queue != None else 0
+
+    def disable_auto_pull_thread(self):
+        if self.__on_new_sample_pull:
+            self.on_new_sample -= self.__on_new_sample_pull
+        self.__on_new_sample_pull = None
+        thread = self.__queue_thread
+        with self.__queue_condition:
+            self.__queue_running = False
+            self.__queue = None
+            self.__queue_condition.notify_all()
+        if thread != None and thread != threading.current_thread():
+            thread.join()
+        self.__queue_thread = None
+
+    def enable_auto_pull_thread(self, max_size: "int" = 30, policy: "str" = DROP_OLDEST, timeout=Gst.USECOND):
+        """
+        the streaming thread only queues the pulled sample, on_pulled_sample handlers run on a worker thread,
+        a full queue drops its oldest sample, the new one, or blocks the streaming thread (policy)
+        """
+        self.__disable_auto_pull_modes()
+        self.queue_max_size = max_size
+        self.queue_policy = policy
+        self.dropped = 0
+        self.max_depth = 0
+        queue: "collections.deque[Gst.Sample]" = collections.deque()
+        condition = self.__queue_condition
+
+        def __on_new_sample_pull(_self):
+            sample = self._try_pull_sample(timeout)
+            if sample == None:
+                return Gst.FlowReturn.OK
+            with condition:
+                if len(queue) >= max_size:
+                    if policy == AppSink.DROP_NEWEST:
+                        self.dropped += 1
+                        return Gst.FlowReturn.OK
+                    if policy == AppSink.BLOCK:
+                        while len(queue) >= max_size and self.__queue is queue:
+                            condition.wait()
+                        if self.__queue is not queue:  # disabled or stopped meanwhile
+                            return Gst.FlowReturn.OK
+                    else:
+                        queue.popleft()
+                        self.dropped += 1
+                queue.append(sample)
+                self.max_depth = max(self.max_depth, len(queue))
+                condition.notify_all()
+            return Gst.FlowReturn.OK
+
+        def __worker():
+            while True:
+                with condition:
+                    while self.__queue_running and len(queue) <= 0:
+                        condition.wait()
+                    if not self.__queue_running:
+                        return
+                    sample = queue.popleft()
+                    condition.notify_all()
+                self.last_sample = sample
+                try:
+                    self.on_pulled_sample(sample)
+                except BaseException as e:
+                    self.logger.exception(e)
+
+        with condition:
+            self.__queue = queue
+            self.__queue_running = True
+        self.__queue_thread = threading.Thread(target=__worker, name="appsink", daemon=True)
+        self.__queue_thread.start()
+        self.__on_new_sample_pull = __on_new_sample_pull
+        self.on_new_sample += self.__on_new_sample_pull
+
     def disable_const_pull(self):
         if self.__on_new_sample_pull:
             self.on_new_sample -= self.__on_new_sample_pull
@@ -598,7 +1172,7 @@ class AppSink:
         self.__on_new_sample_timeout = None
 
     def enable_const_pull(self, timeout=30 * Gst.MSECOND):
-        self.disable_const_pull()
+        self.__disable_auto_pull_modes()
 
         def __on_new_sample_pull(_self):
             if self.__on_new_sample_timeout == None:
@@ -656,16 +1230,17 @@ class Sample():
     def read(self):
         return self.map(Gst.MapFlags.READ)
 
+    def map_frame(self, write=False) -> "MappedFrame":
+        """
+        with sample.map_frame() as frame: ..., frame.planes are unmapped at the end of the block
+        """
+        return MappedFrame(self.buffer, self.sample.get_caps(), write)
+
     def as_mat(self):
-        caps: "Gst.Caps" = self.sample.get_caps()
-        st: "Gst.Structure" = caps.get_structure(0)
-        ret, width = st.get_int("width")
-        ret, height = st.get_int("height")
-        bbp = 3
-        size = width * height * bbp
-        data = np.frombuffer(self.mapinfo.data, np.uint8, size)
-        data = np.reshape(data, (height, width, bbp))
-        return data
+        """
+        view of the read() mapping, the packed image or the Y plane
+        """
+        return video_planes(self.mapinfo.data, self.sample.get_caps(), self.buffer)[0]
 
     def as_bytes(self):
         return self.mapinfo.data
@@ -732,6 +1307,103 @@ class Demux():
         return self.on_no_more_pads(demux)
 
 
+class PadStats:
+    """
+    stream statistics kept by Pad.enable_stats, updated from the pad probe with O(1) state, times in ns
+    """
+
+    def __init__(self, window: "int" = Gst.SECOND) -> None:
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.buffers = 0
+        self.bytes = 0
+        # bit/s of the last buffers over their inter-arrival time
+        self.instant_bitrate = 0.0
+        # bit/s and buffers/s over the last complete window
+        self.bitrate = 0.0
+        self.fps = 0.0
+        # inter-arrival jitter against the buffer running times, rfc 3550 estimator
+        self.jitter = 0.0
+        self.keyframes = 0
+        # pts distance between the last two keyframes
+        self.keyframe_interval: "int" = None
+        # clock running time minus buffer running time at the probe
+        self.latency: "int" = None
+
+        self.__arrival: "int" = None
+        self.__running_time: "int" = None
+        self.__keyframe_running_time: "int" = None
+        self.__window_start: "int" = None
+        self.__window_buffers = 0
+        self.__window_bytes = 0
+
+    def discont(self):
+        """
+        after a flush or a new segment, deltas across it are meaningless
+        """
+        self.__arrival = None
+        self.__running_time = None
+        self.__keyframe_running_time = None
+
+    def update(self, count: "int", size: "int", arrival: "int", running_time: "int" = None, keyframe: "bool" = False, now: "int" = None):
+        """
+        count, size - buffers and bytes seen by the probe
+        arrival - monotonic time of the probe
+        running_time - running time of the first buffer, None without pts or segment
+        now - running time of the pipeline clock, None without a clock
+        """
+        self.buffers += count
+        self.bytes += size
+
+        if self.__arrival != None:
+            arrival_delta = arrival - self.__arrival
+            if arrival_delta > 0:
+                self.instant_bitrate = 8 * size * Gst.SECOND / arrival_delta
+            if running_time != None and self.__running_time != None:
+                d = abs(arrival_delta - (running_time - self.__running_time))
+                self.jitter += (d - self.jitter) / 16
+        self.__arrival = arrival
+        if running_time != None:
+            self.__running_time = running_time
+
+        if self.__window_start == None:
+            self.__window_start = arrival
+        self.__window_buffers += count
+        self.__window_bytes += size
+        elapsed = arrival - self.__window_start
+        if elapsed >= self.window:
+            self.bitrate = 8 * self.__window_bytes * Gst.SECOND / elapsed
+            self.fps = self.__window_buffers * Gst.SECOND / elapsed
+            self.__window_start = arrival
+            self.__window_buffers = 0
+            self.__window_bytes = 0
+
+        if keyframe:
+            self.keyframes += 1
+            if running_time != None:
+                if self.__keyframe_running_time != None:
+                    self.keyframe_interval = running_time - self.__keyframe_running_time
+                self.__keyframe_running_time = running_time
+
+        if running_time != None and now != None:
+            self.latency = now - running_time
+
+    def as_dict(self) -> "dict":
+        return {
+            "buffers": self.buffers,
+            "bytes": self.bytes,
+            "instant_bitrate": self.instant_bitrate,
+            "bitrate": self.bitrate,
+            "fps": self.fps,
+            "jitter": self.jitter,
+            "keyframes": self.keyframes,
+            "keyframe_interval": self.keyframe_interval,
+            "latency": self.latency,
+        }
+
+
 class Pad:
     def __init__(self, pad: "Gst.Pad" = None):
         self.pad: "Gst.Pad" = None
@@ -740,6 +1412,7 @@ class Pad:
         self.__data_count_enabled = False
         self.__data_count_probe_id: "int" = None
         self.__data_count = 0
+        self.__data_bytes = 0
 
         # data count pull
         self.__data_count_auto_pull_enabled = False
@@ -751,6 +1424,16 @@ class Pad:
         self.__eos_probe_id: "int" = None
         self.on_eos: "Event[typing.Callable[[],]]" = Event("on_eos")
 
+        # stats
+        self.__stats_enabled = False
+        self.__stats_probe_id: "int" = None
+        self.__stats = PadStats()
+        self.__segment: "Gst.Segment" = None
+        self.__pipeline: "Gst.Element" = None
+        self.__stats_timeout: "GLib.Source" = None
+        self.__stats_interval: "int" = 1000  # 1 sec
+        self.on_stats: "Event[typing.Callable[[PadStats],]]" = Event("on_stats")
+
         if pad != None:
             self.start(pad)
 
@@ -758,18 +1441,28 @@ class Pad:
     def data_count(self):
         return self.__data_count
 
+    @property
+    def data_bytes(self):
+        return self.__data_bytes
+
+    @property
+    def stats(self) -> "PadStats":
+        return self.__stats
+
     def __del__(self):
         self.clear()
-        get_logger().warning("del Pad", stacklevel=2)
+        # get_logger().warning("del Pad", stacklevel=2)
 
     def clear(self):
         self.stop()
         self.on_data_count.clear()
         self.on_eos.clear()
+        self.on_stats.clear()
 
     def stop(self):
         self.__stop_data_count_auto_pull()
         self.__stop_data_count()
+        self.__stop_stats()
         self.pad = None
 
     def start(self, pad: "Gst.Pad"):
@@ -782,9 +1475,17 @@ class Pad:
                     self.__start_data_count_auto_pull()
             if self.__eos_enabled:
                 self.__start_eos()
+            if self.__stats_enabled:
+                self.__start_stats()
 
     def __data_count_on_pad_probe(self, pad: "Gst.Pad", info: "Gst.PadProbeInfo", user_data=None):
-        self.__data_count += 1
+        if info.type & Gst.PadProbeType.BUFFER_LIST:
+            buffer_list: "Gst.BufferList" = info.get_buffer_list()
+            self.__data_count += buffer_list.length()
+            self.__data_bytes += buffer_list.calculate_size()
+        else:
+            self.__data_count += 1
+            self.__data_bytes += info.get_buffer().get_size()
         return Gst.PadProbeReturn.OK
 
     def __eos_on_pad_probe(self, pad: "Gst.Pad", info: "Gst.PadProbeInfo", user_data=None):
@@ -796,11 +1497,55 @@ class Pad:
             GLib.idle_add(self.on_eos)
         return Gst.PadProbeReturn.OK
 
+    def __stats_on_pad_probe(self, pad: "Gst.Pad", info: "Gst.PadProbeInfo", user_data=None):
+        if info.type & Gst.PadProbeType.EVENT_DOWNSTREAM:
+            event = info.get_event()
+            if event.type == Gst.EventType.SEGMENT:
+                self.__segment = event.parse_segment()
+                self.__stats.discont()
+                # the pipeline clock, for the latency
+                pipeline = pad.get_parent_element()
+                while pipeline != None and pipeline.parent != None:
+                    pipeline = pipeline.parent
+                self.__pipeline = pipeline
+            elif event.type == Gst.EventType.FLUSH_STOP:
+                self.__stats.discont()
+            return Gst.PadProbeReturn.OK
+
+        if info.type & Gst.PadProbeType.BUFFER_LIST:
+            buffer_list: "Gst.BufferList" = info.get_buffer_list()
+            count = buffer_list.length()
+            if count == 0:
+                return Gst.PadProbeReturn.OK
+            size = buffer_list.calculate_size()
+            buffer: "Gst.Buffer" = buffer_list.get(0)
+        else:
+            buffer: "Gst.Buffer" = info.get_buffer()
+            count = 1
+            size = buffer.get_size()
+
+        running_time = None
+        if self.__segment != None and buffer.pts != Gst.CLOCK_TIME_NONE:
+            running_time = self.__segment.to_running_time(Gst.Format.TIME, buffer.pts)
+            if running_time == Gst.CLOCK_TIME_NONE:
+                running_time = None
+        now = None
+        clock: "Gst.Clock" = self.__pipeline.get_clock() if self.__pipeline != None else None
+        if clock != None:
+            now = clock.get_time() - self.__pipeline.get_base_time()
+        keyframe = not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT)
+        self.__stats.update(count, size, time.monotonic_ns(), running_time, keyframe, now)
+        return Gst.PadProbeReturn.OK
+
     def __data_count_auto_pull_timeout_callback(self, user_data=None):
-        data_count = self.pad.data_count
+        data_count = self.data_count
         self.on_data_count(data_count)
         return True
 
+    def __stats_timeout_callback(self, user_data=None):
+        self.on_stats(self.__stats)
+        return True
+
     # data_count
     def __stop_data_count(self):
         if self.pad:
@@ -808,9 +1553,10 @@ class Pad:
                 self.pad.remove_probe(self.__data_count_probe_id)
         self.__data_count_probe_id = None
         self.__data_count = 0
+        self.__data_bytes = 0
 
     def __start_data_count(self):
-        self.__data_count_probe_id = self.pad.add_probe(Gst.PadProbeType.BUFFER, self.__data_count_on_pad_probe)
+        self.__data_count_probe_id = self.pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, self.__data_count_on_pad_probe)
 
     def disable_data_count(self):
         self.__data_count_enabled = False
@@ -827,7 +1573,7 @@ class Pad:
 
     def __start_data_count_auto_pull(self):
         self.__timeout = GLib.timeout_source_new(self.__interval)
-        self.__timeout.add_callback(self.__data_count_auto_pull_timeout_callback)
+        self.__timeout.set_callback(self.__data_count_auto_pull_timeout_callback)
         self.__timeout.attach()
 
     def disable_data_count_auto_pull(self):
@@ -856,6 +1602,132 @@ class Pad:
     def enable_eos(self):
         self.__eos_enabled = True
 
+    # stats
+    def __stop_stats(self):
+        if self.__stats_timeout != None:
+            self.__stats_timeout.destroy()
+        self.__stats_timeout = None
+        if self.pad:
+            if self.__stats_probe_id:
+                self.pad.remove_probe(self.__stats_probe_id)
+        self.__stats_probe_id = None
+        self.__segment = None
+        self.__pipeline = None
+        self.__stats.reset()
+
+    def __start_stats(self):
+        self.__stats_probe_id = self.pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST | Gst.PadProbeType.EVENT_DOWNSTREAM, self.__stats_on_pad_probe)
+        if self.__stats_interval > 0:
+            self.__stats_timeout = GLib.timeout_source_new(self.__stats_interval)
+            self.__stats_timeout.set_callback(self.__stats_timeout_callback)
+            self.__stats_timeout.attach()
+
+    def disable_stats(self):
+        self.__stats_enabled = False
+        self.__stop_stats()
+
+    def enable_stats(self, interval: "int" = 1000, window: "int" = Gst.SECOND):
+        """
+        interval - ms between on_stats, 0 to only read stats
+        window - ns, bitrate and fps window
+        """
+        self.__stats_interval = interval
+        self.__stats.window = window
+        self.__stats_enabled = True
+
+
+class Layout:
+    """
+    rows x cols grid on a compositor, source i goes to cell i through sink_i,
+    the pads scale their source to the cell so the sources need no videoscale/capsfilter of their own
+    """
+
+    def __init__(self, rows: "int" = 2, cols: "int" = 4, width: "int" = 1920, height: "int" = 1080, sources: "list[str]" = None) -> None:
+        """
+        width, height - compositor output, cells are width // cols x height // rows
+        """
+        self.rows = rows
+        self.cols = cols
+        self.width = width
+        self.height = height
+        self.sources: "list[str]" = list(sources) if sources != None else []
+
+    @staticmethod
+    def from_config(config: "Config", default: "Layout" = None) -> "Layout":
+        """
+        {"rows": 2, "cols": 4, "width": 1920, "height": 1080, "sources": [...]}, missing keys from default
+        """
+        if default == None:
+            default = Layout()
+        return Layout(
+            rows=config.get("rows", default.rows, required=False, get=int),
+            cols=config.get("cols", default.cols, required=False, get=int),
+            width=config.get("width", default.width, required=False, get=int),
+            height=config.get("height", default.height, required=False, get=int),
+            sources=config.get("sources", default.sources, required=False, get=list),
+        )
+
+    @property
+    def cell_width(self) -> "int":
+        return self.width // self.cols
+
+    @property
+    def cell_height(self) -> "int":
+        return self.height // self.rows
+
+    @property
+    def size(self) -> "int":
+        return self.rows * self.cols
+
+    def cell(self, index: "int") -> "tuple[int, int, int, int]":
+        """
+        xpos, ypos, width, height of cell index, row major
+        """
+        row, col = divmod(index, self.cols)
+        return col * self.cell_width, row * self.cell_height, self.cell_width, self.cell_height
+
+    def pipe(self, name: "str" = "compositor") -> "str":
+        """
+        the compositor, pads are placed by apply once the sources are linked
+        """
+        return f"compositor name={name} background=black ! capsfilter caps=\"video/x-raw, width={self.width}, height={self.height}\""
+
+    def background_pipe(self, name: "str" = "compositor", pattern: "str" = "black") -> "str":
+        """
+        live full frame source on sink_{size}, under the cells, keeps the compositor running with empty cells
+        """
+        return f"videotestsrc is-live=true pattern={pattern} ! capsfilter caps=\"video/x-raw, width={self.width}, height={self.height}, framerate=30/1\" ! {name}.sink_{self.size}"
+
+    def apply_pad(self, pad: "Gst.Pad", index: "int"):
+        if index == self.size:  # background
+            xpos, ypos, width, height = 0, 0, self.width, self.height
+        else:
+            xpos, ypos, width, height = self.cell(index)
+        pad.set_property("xpos", xpos)
+        pad.set_property("ypos", ypos)
+        pad.set_property("width", width)
+        pad.set_property("height", height)
+        pad.set_property("zorder", (index + 1) % (self.size + 1))
+
+    def apply(self, compositor: "Gst.Element") -> "int":
+        """
+        places every sink_N pad on cell N, also the pads requested later by delayed links (decodebin),
+        returns the pad-added handler id
+        """
+        for pad in compositor.sinkpads:
+            self.__on_pad_added(compositor, pad)
+        return compositor.connect("pad-added", self.__on_pad_added)
+
+    def __on_pad_added(self, compositor: "Gst.Element", pad: "Gst.Pad", user_data=None):
+        name: "str" = pad.get_name()
+        if pad.direction != Gst.PadDirection.SINK or not name.startswith("sink_"):
+            return
+        index = int(name[len("sink_"):])
+        if index > self.size:
+            get_logger().warning(f"{name} outside the {self.rows}x{self.cols} layout")
+            return
+        self.apply_pad(pad, index)
+
 
 import enum
 
@@ -875,11 +1747,184 @@ class GST_FORMAT(str, enum.Enum):
     RGB = "RGB"
     BGR = "BGR"
     GRAY8 = "GRAY8"
+    I420 = "I420"
+    NV12 = "NV12"
 
     def __str__(self):
         return str(self.value)
 
 
+# format: (dtype, channels) of the packed formats
+PACKED_FORMATS: "dict[str, tuple[np.dtype, int]]" = {
+    "GRAY16_LE": (np.dtype("<u2"), 1),
+    "GRAY16_BE": (np.dtype(">u2"), 1),
+    "RGBx": (np.dtype(np.uint8), 4),
+    "xRGB": (np.dtype(np.uint8), 4),
+    "BGRx": (np.dtype(np.uint8), 4),
+    "xBGR": (np.dtype(np.uint8), 4),
+    "RGBA": (np.dtype(np.uint8), 4),
+    "ARGB": (np.dtype(np.uint8), 4),
+    "BGRA": (np.dtype(np.uint8), 4),
+    "ABGR": (np.dtype(np.uint8), 4),
+    "RGB": (np.dtype(np.uint8), 3),
+    "BGR": (np.dtype(np.uint8), 3),
+    "GRAY8": (np.dtype(np.uint8), 1),
+}
+
+
+def round_up_4(n: "int") -> "int":
+    return (n + 3) & ~3
+
+
+def video_format_layout(caps: "Gst.Caps", buffer: "Gst.Buffer" = None) -> "tuple[str, int, int, list[int], list[int]]":
+    """
+    format, width, height, plane offsets and strides in bytes,
+    from the buffer GstVideoMeta, else the caps video info, else the default GStreamer alignment (rows rounded up to 4)
+    """
+    st: "Gst.Structure" = caps.get_structure(0)
+    format = st.get_string("format")
+    ret, width = st.get_int("width")
+    ret, height = st.get_int("height")
+    n_planes = {"I420": 3, "NV12": 2}.get(format, 1)
+    if format not in PACKED_FORMATS and n_planes == 1:
+        raise ValueError(f"unsupported format {format}")
+    if GstVideo != None:
+        meta = GstVideo.buffer_get_video_meta(buffer) if buffer != None else None
+        if meta != None:
+            try:
+                return format, meta.width, meta.height, list(meta.offset)[:n_planes], list(meta.stride)[:n_planes]
+            except TypeError:  # fixed size arrays not exposed by this PyGObject
+                pass
+        try:
+            info = GstVideo.VideoInfo.new_from_caps(caps)
+        except AttributeError:  # before 1.20
+            info = GstVideo.VideoInfo()
+            info.from_caps(caps)
+        if info != None:
+            return format, width, height, list(info.offset)[:n_planes], list(info.stride)[:n_planes]
+    if format == GST_FORMAT.I420:
+        y_stride = round_up_4(width)
+        uv_stride = round_up_4((width + 1) // 2)
+        u_offset = y_stride * ((height + 1) & ~1)
+        v_offset = u_offset + uv_stride * ((height + 1) // 2)
+        return format, width, height, [0, u_offset, v_offset], [y_stride, uv_stride, uv_stride]
+    if format == GST_FORMAT.NV12:
+        stride = round_up_4(width)
+        return format, width, height, [0, stride * ((height + 1) & ~1)], [stride, stride]
+    dtype, channels = PACKED_FORMATS[format]
+    return format, width, height, [0], [round_up_4(width * channels * dtype.itemsize)]
+
+
+def video_planes(data, caps: "Gst.Caps", buffer: "Gst.Buffer" = None) -> "list[np.ndarray]":
+    """
+    strided views over data (the mapped buffer), nothing is copied,
+    packed formats give one (height, width, channels) plane, I420 gives Y, U, V and NV12 gives Y, (h/2, w/2, 2) UV
+    """
+    format, width, height, offsets, strides = video_format_layout(caps, buffer)
+    if format in PACKED_FORMATS:
+        dtype, channels = PACKED_FORMATS[format]
+        return [np.ndarray((height, width, channels), dtype, buffer=data, offset=offsets[0], strides=(strides[0], channels * dtype.itemsize, dtype.itemsize))]
+    half_width = (width + 1) // 2
+    half_height = (height + 1) // 2
+    planes = [np.ndarray((height, width), np.uint8, buffer=data, offset=offsets[0], strides=(strides[0], 1))]
+    if format == GST_FORMAT.I420:
+        for i in (1, 2):
+            planes.append(np.ndarray((half_height, half_width), np.uint8, buffer=data, offset=offsets[i], strides=(strides[i], 1)))
+    else:
+        planes.append(np.ndarray((half_height, half_width, 2), np.uint8, buffer=data, offset=offsets[1], strides=(strides[1], 2, 1)))
+    return planes
+
+
+class MappedFrame:
+    """
+    a video buffer mapped for the duration of a with block, the planes are views of the mapped memory,
+    a view kept past the block keeps the buffer mapped until the last one is gone
+
+        with sample.map_frame() as frame:
+            frame.mat  # (height, width, channels), read only
+    """
+
+    def __init__(self, buffer: "Gst.Buffer", caps: "Gst.Caps", write=False) -> None:
+        self.buffer = buffer
+        self.caps = caps
+        self.write = write
+        self.planes: "list[np.ndarray]" = []
+        self.__mapinfo: "Gst.MapInfo" = None
+        self.__finalizer: "weakref.finalize" = None
+
+    @property
+    def mat(self) -> "np.ndarray":
+        """
+        the packed image, or the Y plane of I420/NV12
+        """
+        return self.planes[0]
+
+    def __enter__(self) -> "MappedFrame":
+        self.map()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.unmap()
+
+    def __del__(self):
+        self.unmap()
+
+    def map(self):
+        self.unmap()
+        flags = Gst.MapFlags.READ | Gst.MapFlags.WRITE if self.write else Gst.MapFlags.READ
+        if self.write and not self.buffer.is_writable():
+            raise ValueError("buffer is shared, map a writable copy")
+        result = self.buffer.map(flags)
+        # (ret, mapinfo) from PyGObject, a MapInfo with a memoryview from the gst-python overrides
+        ret, mapinfo = result if isinstance(result, tuple) else (True, result)
+        if not ret:
+            raise ValueError("failed to map buffer")
+        self.__mapinfo = mapinfo
+        try:
+            data = mapinfo.data
+            if self.write and not isinstance(data, memoryview):
+                raise ValueError("writable mapping needs the gst-python overrides")
+            if isinstance(data, memoryview):
+                # every plane and every view of one has this array as base,
+                # the buffer is unmapped when it goes away, not while a view could still read it
+                data = np.frombuffer(data, np.uint8)
+                self.__finalizer = weakref.finalize(data, MappedFrame._unmap, self.buffer, mapinfo)
+            self.planes = video_planes(data, self.caps, self.buffer)
+        except BaseException:
+            self.unmap()
+            raise
+        if not self.write:
+            for plane in self.planes:
+                plane.flags.writeable = False
+
+    def unmap(self):
+        """
+        unmaps now, or once the last plane view kept by the caller is gone
+        """
+        self.planes = []
+        mapinfo = self.__mapinfo
+        self.__mapinfo = None
+        finalizer = self.__finalizer
+        self.__finalizer = None
+        if mapinfo == None:
+            return
+        if finalizer == None:
+            self.buffer.unmap(mapinfo)
+            return
+        # runs right away when the planes were the last views
+        if finalizer.alive:
+            get_logger().debug("a plane view outlives the with block, unmapping when it is gone", stacklevel=2)
+
+    @staticmethod
+    def _unmap(buffer: "Gst.Buffer", mapinfo: "Gst.MapInfo"):
+        # the base array is being freed, nothing reads the memory anymore
+        try:
+            mapinfo.data.release()
+        except BufferError:
+            pass
+        buffer.unmap(mapinfo)
+
+
 def mat_to_formats(mat: np.ndarray):
     w, h, c = mat.shape
     if c == 1:
@@ -913,6 +1958,11 @@ def mat_to_sample(mat: "np.ndarray", dts: int, pts: int, caps: "Gst.Caps") -> "G
 
 
 class AppSrcMatSender:
+    """
+    pushes numpy images, caps are set on the appsrc once and the frames are copied
+    straight into buffers recycled by a pool, honouring the GStreamer row strides
+    """
+
     def __init__(self, framerate: "int" = 0) -> None:
         super().__init__()
         self.caps = None
@@ -920,6 +1970,15 @@ class AppSrcMatSender:
         self.running_time = 0
         self.appsrc = AppSrc()
 
+        self.pool: "Gst.BufferPool" = None
+        self.pool_min_buffers = 2
+        self.__shape: "tuple" = None
+        self.__dtype: "np.dtype" = None
+        # decided when the pool starts, writable mappings need the gst-python overrides
+        self.__writable_map = False
+        self.__stride = 0
+        self.__rows: "np.ndarray" = None
+
     @property
     def framerate(self):
         return self._framerate
@@ -927,7 +1986,7 @@ class AppSrcMatSender:
     @framerate.setter
     def framerate(self, framerate):
         self._framerate = framerate
-        self._diff = Gst.SECOND / framerate
+        self._diff = Gst.SECOND // framerate if framerate > 0 else 0
         self.caps = None
 
     def __del__(self):
@@ -940,6 +1999,7 @@ class AppSrcMatSender:
 
     def stop(self) -> "any":
         self.appsrc.stop()
+        self.__stop_pool()
         self.caps = None
         self.running_time = 0
 
@@ -947,13 +2007,88 @@ class AppSrcMatSender:
         self.stop()
         self.appsrc.start(appsrc)
 
-    def push_mat(self, mat: "np.ndarray"):
-        if self.caps == None:
-            self.caps = mat_to_caps(mat, self.framerate)
-        sample = mat_to_sample(mat, 0, self.running_time, self.caps)
+    def __stop_pool(self):
+        if self.pool != None:
+            self.pool.set_active(False)
+        self.pool = None
+        self.__shape = None
+        self.__dtype = None
+        self.__rows = None
+
+    def __start_pool(self, mat: "np.ndarray"):
+        """
+        caps and pool follow the first mat, and any later change of shape or dtype
+        """
+        self.__stop_pool()
+        self.caps = mat_to_caps(mat, self.framerate)
+        format, width, height, offsets, strides = video_format_layout(self.caps)
+        self.pool = Gst.BufferPool.new()
+        config: "Gst.Structure" = self.pool.get_config()
+        Gst.BufferPool.config_set_params(config, self.caps, strides[0] * height, self.pool_min_buffers, 0)
+        self.pool.set_config(config)
+        self.pool.set_active(True)
+        self.__shape = mat.shape
+        self.__dtype = mat.dtype
+        self.__stride = strides[0]
+        ret, buffer = self.pool.acquire_buffer(None)
+        try:
+            with MappedFrame(buffer, self.caps, write=True):
+                self.__writable_map = True
+        except ValueError:
+            self.__writable_map = False
+        buffer = None
+        if self.appsrc.appsrc != None:
+            self.appsrc.appsrc.set_property("caps", self.caps)
+
+    def mat_to_buffer(self, mat: "np.ndarray") -> "Gst.Buffer":
+        if mat.ndim == 2:
+            mat = mat[:, :, np.newaxis]
+        if self.caps == None or mat.shape != self.__shape or mat.dtype != self.__dtype:
+            self.__start_pool(mat)
+        ret, buffer = self.pool.acquire_buffer(None)
+        if ret != Gst.FlowReturn.OK:
+            raise ValueError(f"failed to acquire a buffer, {ret}")
+        if self.__writable_map:
+            with MappedFrame(buffer, self.caps, write=True) as frame:
+                np.copyto(frame.mat, mat)
+        else:
+            # no writable mapping, fill copies from bytes
+            height = mat.shape[0]
+            row_size = mat.shape[1] * mat.shape[2] * mat.itemsize
+            if self.__stride == row_size:
+                buffer.fill(0, np.ascontiguousarray(mat).tobytes())
+            else:
+                # rows padded to the GStreamer stride, in a scratch array kept with the pool
+                if self.__rows is None:
+                    self.__rows = np.zeros((height, self.__stride), np.uint8)
+                self.__rows[:, :row_size] = np.ascontiguousarray(mat).view(np.uint8).reshape(height, -1)
+                buffer.fill(0, self.__rows.tobytes())
+        buffer.pts = self.running_time
+        buffer.duration = self._diff if self._diff > 0 else Gst.CLOCK_TIME_NONE
         self.running_time += self._diff
-        # self.appsrc.on_data(sample)
-        self.appsrc.push_sample(sample)
+        return buffer
+
+    def __on_push(self, buffer: "Gst.Buffer"):
+        # AppSrc.on_push_sample, samples are only made when someone listens
+        if len(self.appsrc.on_push_sample) > 0:
+            self.appsrc.on_push_sample(Gst.Sample.new(buffer, self.caps, None, None))
+
+    def push_mat(self, mat: "np.ndarray"):
+        buffer = self.mat_to_buffer(mat)
+        self.__on_push(buffer)
+        return self.appsrc.push_buffer(buffer)
+
+    def push_many(self, mats: "typing.Iterable[np.ndarray]"):
+        """
+        one push for a batch of frames, consecutive timestamps
+        """
+        mats = list(mats)
+        buffer_list: "Gst.BufferList" = Gst.BufferList.new_sized(len(mats))
+        for mat in mats:
+            buffer = self.mat_to_buffer(mat)
+            self.__on_push(buffer)
+            buffer_list.insert(-1, buffer)
+        return self.appsrc.push_buffer_list(buffer_list)
 
     @property
     def push_sample(self):
@@ -988,6 +2123,419 @@ class AppSrcMatSender:
         self.appsrc.appsink = appsink
 
 
+class FrameStore:
+    """
+    raw frames of a finite sequence, decoded once and replayed in a loop through an appsrc,
+    kept in memory or in an mmap'd temporary file
+    """
+    MEMORY = "memory"
+    MMAP = "mmap"
+
+    # when the sequence does not fit in max_bytes
+    TRUNCATE = "truncate"  # loop the frames that fit
+    FALLBACK = "fallback"  # keep nothing, the caller decodes from the source again
+
+    def __init__(self, max_bytes: "int", storage: "str" = MEMORY, eviction: "str" = TRUNCATE, directory: "str" = None) -> None:
+        self.max_bytes = max_bytes
+        self.storage = storage
+        self.eviction = eviction
+        self.directory = directory  # mmap files, default temporary directory
+
+        self.caps: "Gst.Caps" = None
+        self.duration: "int" = Gst.CLOCK_TIME_NONE  # ns per frame
+        self.frame_size = 0
+        self.frames = 0
+        self.bytes = 0
+        self.loaded = False
+        self.truncated = False
+        self.evicted = False
+
+        # the frames, in mmap storage buffers of file backed memory
+        self.__buffers: "list[Gst.Buffer]" = []
+        self.__file: "typing.IO" = None
+
+        self.appsrc = AppSrc()
+        self.appsrc.on_need_data += self.__on_need_data
+        self.__index = 0
+        self.__count = 0
+
+        self.logger = get_logger()
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+        self.appsrc.clear()
+        self.__release()
+
+    def stop(self):
+        self.appsrc.stop()
+        self.__index = 0
+        self.__count = 0
+
+    def start(self, appsrc: "Gst.Element"):
+        """
+        appsrc - format=time, caps are set from the decoded sequence
+        """
+        self.stop()
+        if not self.loaded:
+            return
+        appsrc.set_property("caps", self.caps)
+        self.appsrc.start(appsrc)
+
+    def pipe(self, name: "str") -> "str":
+        return f"appsrc name={name} format=time is-live=false"
+
+    def __release(self):
+        self.__buffers = []
+        if self.__file != None:
+            self.__file.close()  # unlinked on close
+        self.__file = None
+        self.caps = None
+        self.frame_size = 0
+        self.frames = 0
+        self.bytes = 0
+        self.loaded = False
+
+    def load(self, pipe: "str", timeout: "int" = 5 * Gst.SECOND) -> "bool":
+        """
+        pipe - finite source ending in raw video, e.g. multifilesrc loop=false ! decodebin ! videoconvert,
+        blocks until the sequence is decoded, returns whether frames can be replayed
+        """
+        self.__release()
+        self.truncated = False
+        self.evicted = False
+        if self.storage == FrameStore.MMAP:
+            self.__file = tempfile.TemporaryFile(prefix="frames", dir=self.directory)
+        pipe += " ! appsink name=appsink sync=false"
+        self.logger.pipeline(pipe)
+        pipeline: "Gst.Pipeline" = Gst.parse_launch(pipe)
+        appsink: "Gst.Element" = pipeline.get_by_name("appsink")
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            while True:
+                sample: "Gst.Sample" = appsink.emit("try-pull-sample", timeout)
+                if sample == None:
+                    break
+                if not self.__store(sample):
+                    break
+            message: "Gst.Message" = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+            if message != None:
+                err, debug = message.parse_error()
+                self.logger.error(f"{err}: {debug}")
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+        if self.evicted or self.frames <= 0:
+            self.__release()
+            return False
+        if self.__file != None:
+            self.__file.flush()
+            self.__wrap_file()
+        self.loaded = True
+        self.logger.info(f"{self.frames} frames, {self.bytes >> 20} MiB in {self.storage}{', truncated' if self.truncated else ''}")
+        return True
+
+    def __store(self, sample: "Gst.Sample") -> "bool":
+        buffer: "Gst.Buffer" = sample.get_buffer()
+        size = buffer.get_size()
+        if self.caps == None:
+            self.caps = sample.get_caps()
+            self.frame_size = size
+            structure: "Gst.Structure" = self.caps.get_structure(0)
+            ok, num, denom = structure.get_fraction("framerate")
+            if ok and num > 0:
+                self.duration = Gst.util_uint64_scale_int(Gst.SECOND, denom, num)
+            elif buffer.duration != Gst.CLOCK_TIME_NONE:
+                self.duration = buffer.duration
+            else:
+                self.duration = Gst.SECOND // 30
+        if size != self.frame_size:
+            self.logger.warning(f"frame size changed {self.frame_size} -> {size}, sequence cut")
+            return False
+        if self.bytes + size > self.max_bytes:
+            if self.eviction == FrameStore.FALLBACK:
+                self.evicted = True
+            else:
+                self.truncated = True
+            self.logger.warning(f"over {self.max_bytes >> 20} MiB after {self.frames} frames, {self.eviction}")
+            return False
+        if self.__file != None:
+            self.__file.write(buffer.extract_dup(0, size))
+        else:
+            # deep copy, the decoder pool buffers must go back to their pool
+            self.__buffers.append(buffer.copy_deep())
+        self.frames += 1
+        self.bytes += size
+        return True
+
+    def __wrap_file(self):
+        """
+        one buffer per frame of the file, made once, the replay only shares them
+        """
+        if GstAllocators != None:
+            # fd memory, GStreamer maps the file itself, no copy
+            allocator = GstAllocators.FdAllocator.new()
+            memory: "Gst.Memory" = GstAllocators.FdAllocator.alloc(allocator, self.__file.fileno(), self.bytes, GstAllocators.FdMemoryFlags.DONT_CLOSE)
+            for i in range(self.frames):
+                buffer: "Gst.Buffer" = Gst.Buffer.new()
+                buffer.append_memory(memory.share(i * self.frame_size, self.frame_size))
+                self.__buffers.append(buffer)
+            return
+        # without GstAllocators new_wrapped copies, once per frame here
+        with mmap.mmap(self.__file.fileno(), self.bytes, access=mmap.ACCESS_READ) as _mmap:
+            for i in range(self.frames):
+                offset = i * self.frame_size
+                self.__buffers.append(Gst.Buffer.new_wrapped(_mmap[offset:offset + self.frame_size]))
+        self.logger.warning("GstAllocators missing, the mmap frames were copied to memory")
+
+    def frame(self, index: "int") -> "Gst.Buffer":
+        # shares the stored memory, only the metadata is new
+        return self.__buffers[index].copy()
+
+    def __on_need_data(self, appsrc: "Gst.Element", length: "int"):
+        buffer = self.frame(self.__index)
+        buffer.pts = self.__count * self.duration
+        buffer.dts = Gst.CLOCK_TIME_NONE
+        buffer.duration = self.duration
+        self.__index = (self.__index + 1) % self.frames
+        self.__count += 1
+        self.appsrc.push_buffer(buffer)
+
+
+class FrameRing:
+    """
+    raw frames of a packed format written to a memory mapped ring file for local readers, see FrameRingReader,
+    the writer never waits for the readers
+
+    header, little endian: HEADER, then SLOT per slot, then the slots at page aligned offsets,
+    a slot sequence of 0 marks a slot being written, readers check it again after reading
+    """
+    MAGIC = b"GSTR"
+    CLOSED = b"GSTX"  # the writer moved to a new file (new caps) or stopped
+    VERSION = 1
+    # magic, version, slots, width, height, format, rows, cols, slot offset, slot size, sequence
+    HEADER = struct.Struct("<4sIIII16sIIQQQ")
+    SEQUENCE_OFFSET = HEADER.size - 8
+    # sequence, pts
+    SLOT = struct.Struct("<QQ")
+
+    def __init__(self, path: "str", slots: "int" = 4, rows: "int" = 1, cols: "int" = 1) -> None:
+        """
+        rows, cols - grid of the frame, readers slice the tiles out of it
+        """
+        self.path = path
+        self.slots = slots
+        self.rows = rows
+        self.cols = cols
+        self.sequence = 0
+        self.format: "str" = None
+        self.width = 0
+        self.height = 0
+
+        self.__caps: "Gst.Caps" = None
+        self.__file: "typing.IO" = None
+        self.__mmap: "mmap.mmap" = None
+        self.__slot_offset = 0
+        self.__slot_size = 0
+        self.__views: "list[np.ndarray]" = []
+
+        self.logger = get_logger()
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+
+    def stop(self):
+        if self.__mmap != None:
+            self.__mmap[0:4] = FrameRing.CLOSED
+            self.__views = []
+            self.__mmap.close()
+        self.__mmap = None
+        if self.__file != None:
+            self.__file.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self.__file = None
+        self.__caps = None
+        self.sequence = 0
+
+    def __open(self, caps: "Gst.Caps"):
+        self.stop()
+        format, width, height, offsets, strides = video_format_layout(caps)
+        if format not in PACKED_FORMATS:
+            raise ValueError(f"unsupported format {format}, a packed format is needed")
+        dtype, channels = PACKED_FORMATS[format]
+        page = mmap.PAGESIZE
+        self.__slot_offset = (FrameRing.HEADER.size + FrameRing.SLOT.size * self.slots + page - 1) // page * page
+        frame_size = width * height * channels * dtype.itemsize
+        self.__slot_size = (frame_size + page - 1) // page * page
+        size = self.__slot_offset + self.__slot_size * self.slots
+
+        # built aside and renamed, readers never see a half written header
+        directory = os.path.dirname(os.path.abspath(self.path))
+        file = tempfile.NamedTemporaryFile(prefix=".frames", dir=directory, delete=False)
+        file.truncate(size)
+        self.__mmap = mmap.mmap(file.fileno(), size)
+        FrameRing.HEADER.pack_into(
+            self.__mmap, 0, FrameRing.MAGIC, FrameRing.VERSION, self.slots, width, height, format.encode(),
+            self.rows, self.cols, self.__slot_offset, self.__slot_size, 0)
+        os.replace(file.name, self.path)
+        self.__file = file
+        self.__views = [
+            np.ndarray((height, width, channels), dtype, buffer=self.__mmap, offset=self.__slot_offset + i * self.__slot_size)
+            for i in range(self.slots)
+        ]
+        self.__caps = caps
+        self.format = format
+        self.width = width
+        self.height = height
+        self.logger.info(f"{self.path}: {width}x{height} {format}, {self.slots} slots")
+
+    def write(self, sample: "Gst.Sample"):
+        if sample == None:
+            return
+        caps: "Gst.Caps" = sample.get_caps()
+        if self.__caps == None or not self.__caps.is_equal(caps):
+            self.__open(caps)
+        buffer: "Gst.Buffer" = sample.get_buffer()
+        sequence = self.sequence + 1
+        slot = sequence % self.slots
+        slot_offset = FrameRing.HEADER.size + slot * FrameRing.SLOT.size
+        FrameRing.SLOT.pack_into(self.__mmap, slot_offset, 0, 0)
+        with MappedFrame(buffer, caps) as frame:
+            np.copyto(self.__views[slot], frame.mat.reshape(self.__views[slot].shape))
+        pts = buffer.pts if buffer.pts != Gst.CLOCK_TIME_NONE else 0
+        FrameRing.SLOT.pack_into(self.__mmap, slot_offset, sequence, pts)
+        struct.pack_into("<Q", self.__mmap, FrameRing.SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+
+
+class FrameRingReader:
+    """
+    reads a FrameRing file, frames are read only numpy views of the mapping, no copy
+
+        reader = FrameRingReader("/dev/shm/webrtc_composite")
+        frame = reader.read()
+        if frame != None:
+            sequence, pts, mat = frame
+            ...
+            if not reader.valid(sequence):  # overwritten while in use
+                ...
+    """
+
+    def __init__(self, path: "str") -> None:
+        self.path = path
+        self.slots = 0
+        self.width = 0
+        self.height = 0
+        self.format: "str" = None
+        self.rows = 1
+        self.cols = 1
+
+        self.__file: "typing.IO" = None
+        self.__mmap: "mmap.mmap" = None
+        self.__views: "list[np.ndarray]" = []
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self) -> "FrameRingReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        # views handed out keep the mapping alive until they are released
+        self.__views = []
+        self.__mmap = None
+        if self.__file != None:
+            self.__file.close()
+        self.__file = None
+
+    def open(self) -> "bool":
+        self.close()
+        try:
+            self.__file = open(self.path, "rb")
+            self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.close()
+            return False
+        if len(self.__mmap) < FrameRing.HEADER.size:
+            self.close()
+            return False
+        magic, version, slots, width, height, format, rows, cols, slot_offset, slot_size, sequence = FrameRing.HEADER.unpack_from(self.__mmap, 0)
+        format = format.rstrip(b"\0").decode()
+        if magic != FrameRing.MAGIC or version != FrameRing.VERSION or format not in PACKED_FORMATS:
+            self.close()
+            return False
+        dtype, channels = PACKED_FORMATS[format]
+        self.slots, self.width, self.height, self.format, self.rows, self.cols = slots, width, height, format, rows, cols
+        self.__views = [
+            np.frombuffer(self.__mmap, dtype, width * height * channels, slot_offset + i * slot_size).reshape((height, width, channels))
+            for i in range(slots)
+        ]
+        return True
+
+    @property
+    def sequence(self) -> "int":
+        if self.__mmap == None:
+            return 0
+        return struct.unpack_from("<Q", self.__mmap, FrameRing.SEQUENCE_OFFSET)[0]
+
+    def valid(self, sequence: "int") -> "bool":
+        """
+        whether the frame of sequence is still in its slot
+        """
+        if self.__mmap == None or self.slots <= 0:
+            return False
+        slot_sequence, pts = FrameRing.SLOT.unpack_from(self.__mmap, FrameRing.HEADER.size + (sequence % self.slots) * FrameRing.SLOT.size)
+        return slot_sequence == sequence and self.__mmap[0:4] == FrameRing.MAGIC
+
+    def read(self, after: "int" = 0) -> "tuple[int, int, np.ndarray]":
+        """
+        (sequence, pts, view) of the newest frame after sequence after, None when there is none yet,
+        reopens the file when the writer moved to a new one
+        """
+        if self.__mmap == None or self.__mmap[0:4] != FrameRing.MAGIC:
+            if not self.open():
+                return None
+        sequence = self.sequence
+        if sequence == 0 or sequence <= after:
+            return None
+        slot = sequence % self.slots
+        slot_sequence, pts = FrameRing.SLOT.unpack_from(self.__mmap, FrameRing.HEADER.size + slot * FrameRing.SLOT.size)
+        if slot_sequence != sequence:
+            # lapped by the writer meanwhile
+            return None
+        return sequence, pts, self.__views[slot]
+
+    def wait(self, after: "int" = 0, timeout: "float" = 1.0, interval: "float" = 0.002) -> "tuple[int, int, np.ndarray]":
+        """
+        polls read until a frame newer than after, None on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.read(after)
+            if frame != None or time.monotonic() >= deadline:
+                return frame
+            time.sleep(interval)
+
+    def tile(self, mat: "np.ndarray", index: "int") -> "np.ndarray":
+        """
+        view of cell index of the rows x cols grid of the frame
+        """
+        cell_height = self.height // self.rows
+        cell_width = self.width // self.cols
+        row, col = divmod(index, self.cols)
+        return mat[row * cell_height:(row + 1) * cell_height, col * cell_width:(col + 1) * cell_width]
+
+
 class Display():
     def __init__(self, framerate) -> None:
         self.appsrc = AppSrcMatSender(framerate)
@@ -1019,6 +2567,7 @@ class Display():
         pipe = ""
         pipe += "appsrc"
         pipe += " name=appsrc"
+        pipe += " format=time"
         pipe += " is-live=true"
         pipe += " ! "
         pipe += "videoconvert ! "
@@ -0,0 +1,96 @@
+import time
+import typing
+
+from .logger import get_logger
+
+
+class Metric:
+    def __init__(self, name: "str", kind: "str", help: "str" = "") -> None:
+        """
+        kind - "counter" or "gauge"
+        """
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.samples: "list[tuple[dict, float]]" = []
+
+    def add(self, value: "float", **labels):
+        self.samples.append((labels, value))
+        return self
+
+
+class Rate:
+    """
+    per second rate of a counter between two updates, update() from a timer, a scrape only reads rate
+    """
+
+    def __init__(self) -> None:
+        self.rate = 0.0
+        self.__value: "float" = None
+        self.__time: "float" = None
+
+    def update(self, value: "float") -> "float":
+        now = time.monotonic()
+        if self.__time != None and now > self.__time and value >= self.__value:
+            self.rate = (value - self.__value) / (now - self.__time)
+        self.__value = value
+        self.__time = now
+        return self.rate
+
+
+def _escape(value) -> "str":
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value) -> "str":
+    if value == None:
+        return "NaN"
+    if type(value) == bool:
+        return "1" if value else "0"
+    return repr(float(value)) if type(value) == float else str(int(value))
+
+
+class Registry:
+    """
+    prometheus text exposition, collectors only read counters that are already kept up to date
+    """
+
+    def __init__(self, prefix: "str" = "") -> None:
+        self.prefix = prefix
+        self.collectors: "list[typing.Callable[[], typing.Iterable[Metric]]]" = []
+        self.logger = get_logger()
+
+    def add_collector(self, collector: "typing.Callable[[], typing.Iterable[Metric]]"):
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector: "typing.Callable[[], typing.Iterable[Metric]]"):
+        self.collectors.remove(collector)
+
+    def collect(self) -> "list[Metric]":
+        metrics: "dict[str, Metric]" = {}
+        for collector in self.collectors:
+            try:
+                for metric in collector():
+                    current = metrics.get(metric.name, None)
+                    if current == None:
+                        metrics[metric.name] = metric
+                    else:
+                        current.samples += metric.samples
+            except BaseException as e:
+                self.logger.exception(e)
+        return list(metrics.values())
+
+    def render(self) -> "str":
+        lines = []
+        for metric in self.collect():
+            name = f"{self.prefix}{metric.name}"
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in metric.samples:
+                if len(labels) > 0:
+                    _labels = ",".join(f"{key}=\"{_escape(label)}\"" for key, label in labels.items())
+                    lines.append(f"{name}{{{_labels}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -1,3 +1,5 @@
+import bisect
+import threading
 import typing
 
 T = typing.TypeVar("T")
@@ -46,24 +48,45 @@ KEY = typing.TypeVar("KEY")
 
 
 class RingBufferWithKey(typing.Generic[T]):
-    def __init__(self, size: int, get_key: "typing.Callable[[T],KEY]") -> None:
+    def __init__(self, size: int, get_key: "typing.Callable[[T],KEY]", get_size: "typing.Callable[[T],int]" = None, max_bytes: int = 0) -> None:
+        """
+        get_size - bytes of an item, kept in bytes
+        max_bytes - drops the oldest items over it, 0 for no limit, needs get_size
+        """
         self.size = size
         self.start = 0
         self.end = 0
         self.count = 0
+        self.bytes = 0
         self.get_key = get_key
+        self.get_size = get_size
+        self.max_bytes = max_bytes
         self._list: "list[T]" = [None] * self.size
+        self._sizes: "list[int]" = [0] * self.size
         self._dict: "dict[KEY, T]" = {}
 
+    def __pop_start(self):
+        self._dict.pop(self.get_key(self._list[self.start]), None)
+        self.bytes -= self._sizes[self.start]
+        self._list[self.start] = None
+        self._sizes[self.start] = 0
+        self.start = (self.start + 1) % self.size
+
     def push(self, item: "T"):
+        size = self.get_size(item) if self.get_size != None else 0
         self._list[self.end] = item
+        self._sizes[self.end] = size
+        self.bytes += size
         self.end = (self.end + 1) % self.size
         if self.end == self.start:
-            self._dict.pop(self.get_key(self._list[self.start]), None)
-            self.start = (self.start + 1) % self.size
+            self.__pop_start()
         else:
             self.count += 1
         self._dict[self.get_key(item)] = item
+        if self.max_bytes > 0:
+            while self.bytes > self.max_bytes and self.count > 1:
+                self.__pop_start()
+                self.count -= 1
 
     def __iter__(self):
         end = self.end
@@ -80,7 +103,9 @@ class RingBufferWithKey(typing.Generic[T]):
         self.start = 0
         self.end = 0
         self.count = 0
+        self.bytes = 0
         self._list: "list[T]" = [None] * self.size
+        self._sizes: "list[int]" = [0] * self.size
         self._dict: "dict[KEY, T]" = {}
 
     def __getitem__(self, key: KEY) -> T:
@@ -88,3 +113,92 @@ class RingBufferWithKey(typing.Generic[T]):
 
     def get(self, key: "KEY", default=None) -> T:
         return self._dict.get(key, default)
+
+
+class ByteRingBuffer(typing.Generic[T]):
+    """
+    ring bounded by the total bytes of its items, indexed by a non decreasing key such as the pts,
+    items sit in plain lists after a head offset so snapshots are list slices and lookups are bisects
+    """
+
+    def __init__(self, max_bytes: int, get_size: "typing.Callable[[T],int]", get_key: "typing.Callable[[T],int]", max_items: int = 0) -> None:
+        """
+        max_bytes - drops the oldest items over it, the newest item is always kept
+        get_key - a key lower than the previous one is raised to it, the keys stay sorted
+        max_items - also drops the oldest items over it, 0 for no limit
+        """
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.get_size = get_size
+        self.get_key = get_key
+        self.bytes = 0
+        self.__lock = threading.Lock()
+        self.__head = 0
+        self.__items: "list[T]" = []
+        self.__keys: "list[int]" = []
+        self.__sizes: "list[int]" = []
+
+    @property
+    def count(self) -> int:
+        return len(self.__items) - self.__head
+
+    def __len__(self):
+        return self.count
+
+    def push(self, item: "T"):
+        size = self.get_size(item)
+        key = self.get_key(item)
+        with self.__lock:
+            if len(self.__keys) > self.__head and key < self.__keys[-1]:
+                key = self.__keys[-1]
+            self.__items.append(item)
+            self.__keys.append(key)
+            self.__sizes.append(size)
+            self.bytes += size
+            head = self.__head
+            end = len(self.__items) - 1
+            while head < end and (self.bytes > self.max_bytes or (self.max_items > 0 and end + 1 - head > self.max_items)):
+                self.bytes -= self.__sizes[head]
+                self.__items[head] = None
+                head += 1
+            self.__head = head
+            # compact once the dropped prefix outgrows the live items, amortized O(1) per push
+            if head > 32 and head * 2 > len(self.__items):
+                del self.__items[:head]
+                del self.__keys[:head]
+                del self.__sizes[:head]
+                self.__head = 0
+
+    def snapshot(self) -> "list[T]":
+        with self.__lock:
+            return self.__items[self.__head:]
+
+    def since(self, key: int) -> "list[T]":
+        """
+        items from the first one with a key at or after key
+        """
+        with self.__lock:
+            index = bisect.bisect_left(self.__keys, key, self.__head)
+            return self.__items[index:]
+
+    def first_key(self, default=None) -> int:
+        with self.__lock:
+            return self.__keys[self.__head] if len(self.__keys) > self.__head else default
+
+    def last_key(self, default=None) -> int:
+        with self.__lock:
+            return self.__keys[-1] if len(self.__keys) > self.__head else default
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        with self.__lock:
+            self.bytes = 0
+            self.__head = 0
+            self.__items: "list[T]" = []
+            self.__keys: "list[int]" = []
+            self.__sizes: "list[int]" = []
@@ -0,0 +1,231 @@
+import os
+import re
+import sys
+import threading
+import typing
+
+from .gst import Gst, TRACERS, TRACER_FD
+from .logger import get_logger
+from .metrics import Metric
+
+
+def _parse_time(value) -> "int":
+    """
+    ns from a guint64 field, or a 0:00:00.012345678 string (GstShark)
+    """
+    if isinstance(value, int):
+        return value
+    h, m, s = str(value).split(":")
+    return (int(h) * 3600 + int(m) * 60) * Gst.SECOND + round(float(s) * Gst.SECOND)
+
+
+# "0:00:01.234567890 4242 0x5581b4c0 TRACE GST_TRACER :0:: latency, src-element-id=..." from the default log function
+_RECORD = re.compile(r" GST_TRACER +\S*:\d+:\S*:\S* (.*)$")
+
+_readers: "list[TracerStats]" = []
+_readers_lock = threading.Lock()
+_reader_thread: "threading.Thread" = None
+
+
+def _read_records():
+    # drains the log pipe for as long as the process runs, other categories of a user GST_DEBUG go on to stderr
+    with os.fdopen(TRACER_FD, "r", errors="replace", closefd=False) as f:
+        for line in f:
+            match = _RECORD.search(line)
+            if match == None:
+                sys.stderr.write(line)
+                continue
+            with _readers_lock:
+                readers = tuple(_readers)
+            for reader in readers:
+                reader._on_record(match.group(1))
+
+
+class ElementStats:
+    """
+    one element, times in ns
+    """
+
+    def __init__(self) -> None:
+        # latency(flags=element), buffer time from the element sink to its src
+        self.latency_count = 0
+        self.latency_total = 0
+        self.latency_max = 0
+        # proctime
+        self.proc_time_count = 0
+        self.proc_time_total = 0
+        self.proc_time_max = 0
+
+    def add_latency(self, time: "int"):
+        self.latency_count += 1
+        self.latency_total += time
+        self.latency_max = max(self.latency_max, time)
+
+    def add_proc_time(self, time: "int"):
+        self.proc_time_count += 1
+        self.proc_time_total += time
+        self.proc_time_max = max(self.proc_time_max, time)
+
+    def as_dict(self) -> "dict":
+        return {
+            "frames": max(self.latency_count, self.proc_time_count),
+            "latency_mean": self.latency_total / self.latency_count / Gst.SECOND if self.latency_count > 0 else None,
+            "latency_max": self.latency_max / Gst.SECOND if self.latency_count > 0 else None,
+            "proc_time_mean": self.proc_time_total / self.proc_time_count / Gst.SECOND if self.proc_time_count > 0 else None,
+            "proc_time_max": self.proc_time_max / Gst.SECOND if self.proc_time_count > 0 else None,
+        }
+
+
+class TracerStats:
+    """
+    aggregates the GST_TRACER records of the latency, proctime and queuelevel tracers per element,
+    the tracers are enabled with WEBRTC_TRACERS before Gst.init, see utils/gst.py,
+    GStreamer writes the records to a pipe and they are parsed on a reader thread, never on the streaming threads
+    """
+
+    def __init__(self) -> None:
+        self.elements: "dict[str, ElementStats]" = {}
+        # queue name -> last queuelevel record
+        self.queues: "dict[str, dict]" = {}
+        # "src-element -> sink-element" -> (count, total, max) of the pipeline latency records
+        self.paths: "dict[str, tuple[int, int, int]]" = {}
+        self.records = 0
+        self.errors = 0
+        self.__lock = threading.Lock()
+        self.__started = False
+        self.logger = get_logger()
+
+    @property
+    def enabled(self) -> "bool":
+        return TRACERS != ""
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.elements = {}
+            self.queues = {}
+            self.paths = {}
+            self.records = 0
+            self.errors = 0
+
+    def stop(self):
+        if not self.__started:
+            return
+        self.__started = False
+        with _readers_lock:
+            _readers.remove(self)
+            last = len(_readers) <= 0
+        if last:
+            # the tracers stop writing records, the reader thread keeps draining the pipe
+            Gst.debug_set_threshold_for_name("GST_TRACER", Gst.DebugLevel.NONE)
+
+    def start(self):
+        global _reader_thread
+        self.stop()
+        if not self.enabled:
+            self.logger.warning("tracers are off, set WEBRTC_TRACERS=1")
+            return
+        if TRACER_FD == None:
+            self.logger.warning(f"the tracer records go to GST_DEBUG_FILE={os.environ.get('GST_DEBUG_FILE')}, unset it to parse them")
+            return
+        with _readers_lock:
+            _readers.append(self)
+            if _reader_thread == None:
+                _reader_thread = threading.Thread(target=_read_records, name="tracers", daemon=True)
+                _reader_thread.start()
+        self.__started = True
+        Gst.debug_set_threshold_for_name("GST_TRACER", Gst.DebugLevel.TRACE)
+
+    def _on_record(self, record: "str"):
+        # reader thread
+        try:
+            self.parse(record)
+        except BaseException as e:
+            self.errors += 1
+
+    def __element(self, name: "str") -> "ElementStats":
+        element = self.elements.get(name, None)
+        if element == None:
+            element = self.elements[name] = ElementStats()
+        return element
+
+    def parse(self, record: "str"):
+        structure: "Gst.Structure" = Gst.Structure.new_from_string(record)
+        if structure == None:
+            self.errors += 1
+            return
+        name = structure.get_name()
+        with self.__lock:
+            self.records += 1
+            if name == "element-latency":
+                self.__element(structure.get_value("element")).add_latency(_parse_time(structure.get_value("time")))
+            elif name == "proctime":
+                self.__element(structure.get_value("element")).add_proc_time(_parse_time(structure.get_value("time")))
+            elif name == "latency":
+                path = f"{structure.get_value('src-element')} -> {structure.get_value('sink-element')}"
+                time = _parse_time(structure.get_value("time"))
+                count, total, _max = self.paths.get(path, (0, 0, 0))
+                self.paths[path] = (count + 1, total + time, max(_max, time))
+            elif name == "queuelevel":
+                self.queues[structure.get_value("queue")] = {
+                    structure.nth_field_name(i): structure.get_value(structure.nth_field_name(i))
+                    for i in range(structure.n_fields())
+                    if structure.nth_field_name(i) != "queue"
+                }
+
+    def snapshot(self, pipeline: "Gst.Bin" = None) -> "dict":
+        """
+        per element stats in seconds, with the element factory when pipeline holds the element,
+        and summed per factory (x264enc, compositor, videoconvert, ...)
+        """
+        with self.__lock:
+            elements = {name: stats.as_dict() for name, stats in self.elements.items()}
+            queues = {name: dict(level) for name, level in self.queues.items()}
+            paths = {
+                path: {"frames": count, "latency_mean": total / count / Gst.SECOND, "latency_max": _max / Gst.SECOND}
+                for path, (count, total, _max) in self.paths.items()
+            }
+        factories: "dict[str, dict]" = {}
+        for name, stats in elements.items():
+            element: "Gst.Element" = pipeline.get_by_name(name) if pipeline != None else None
+            factory: "Gst.ElementFactory" = element.get_factory() if element != None else None
+            if factory == None:
+                continue
+            stats["factory"] = factory.get_name()
+            total = factories.setdefault(stats["factory"], {"elements": 0, "latency_mean": 0.0, "proc_time_mean": 0.0})
+            total["elements"] += 1
+            total["latency_mean"] += stats["latency_mean"] or 0.0
+            total["proc_time_mean"] += stats["proc_time_mean"] or 0.0
+        return {
+            "enabled": self.enabled,
+            "records": self.records,
+            "errors": self.errors,
+            "elements": elements,
+            "factories": factories,
+            "paths": paths,
+            "queues": queues,
+        }
+
+    def collect_metrics(self) -> "list[Metric]":
+        latency = Metric("tracer_element_latency_seconds", "gauge", "mean buffer time through the element, latency tracer")
+        proc_time = Metric("tracer_element_proc_time_seconds", "gauge", "mean processing time per buffer, proctime tracer")
+        frames = Metric("tracer_element_frames_total", "counter", "buffers seen by the tracers")
+        queue_level = Metric("tracer_queue_level_buffers", "gauge", "queue fill level, queuelevel tracer")
+        with self.__lock:
+            for name, stats in self.elements.items():
+                values = stats.as_dict()
+                frames.add(values["frames"], element=name)
+                if values["latency_mean"] != None:
+                    latency.add(values["latency_mean"], element=name)
+                if values["proc_time_mean"] != None:
+                    proc_time.add(values["proc_time_mean"], element=name)
+            for name, level in self.queues.items():
+                if "size_buffers" in level:
+                    queue_level.add(level["size_buffers"], queue=name)
+        return [latency, proc_time, frames, queue_level]
@@ -9,6 +9,7 @@ import re
 import signal
 import sys
 import threading
+import time
 import typing
 from datetime import datetime
 from io import TextIOWrapper
@@ -27,6 +28,8 @@ import utils.gstapp as gstapp
 import utils.logger as LOGGER
 from utils.config import Config, path_make
 from utils.event import Event
+from utils.metrics import Metric, Rate, Registry
+from utils.tracers import TracerStats
 from utils.gst import GLib, Gst, GstSdp, GstWebRTC
 from utils.logger import XT, Logger, get_logger, load_package_logger
 
@@ -151,6 +154,16 @@ class WebRTCBin:
     def add_ice_candidate(self, sdpMLineIndex, candidate):
         self.webrtcbin.emit('add-ice-candidate', sdpMLineIndex, candidate)
 
+    def get_stats(self, callback: "typing.Callable[[dict],]", pad: "Gst.Pad" = None):
+        """
+        callback - called from the webrtcbin thread with {stats id: {field: value}}
+        """
+        def __on_get_stats(promise: "Gst.Promise"):
+            reply: "Gst.Structure" = promise.get_reply()
+            callback(gstapp.structure_to_dict(reply) if reply != None else {})
+        promise = Gst.Promise.new_with_change_func(__on_get_stats)
+        return self.webrtcbin.emit("get-stats", pad, promise)
+
     def create_datachannel(self, name: "str", options: "Gst.Structure" = None) -> GstWebRTC.WebRTCDataChannel:
         datachannel: GstWebRTC.WebRTCDataChannel = self.webrtcbin.emit("create-data-channel", name, options)
         # logger.debug(f"create_datachannel {datachannel}")
@@ -289,6 +302,11 @@ class DataChannelAppSink(DataChannel):
 
 
 class Branch:
+    # Gst.Buffer.copy() calls skipped by pushing the shared sample, over all branches,
+    # only the buffer metadata copy is saved, the memory was shared either way and webrtcbin
+    # still copies a buffer it has to make writable
+    total_metadata_copies_skipped = 0
+
     def __init__(self):
         self.appsrc: "gstapp.AppSrc" = None
         self.bin: "Gst.Bin" = None
@@ -296,6 +314,19 @@ class Branch:
         self._appsink: "gstapp.AppSink" = None
         self.target: "Gst.Element" = None
 
+        # appended after the appsrc, inside the branch bin
+        self.pipe_tail = ""
+
+        # push the upstream sample as is (shared, read only) and rebase timestamps with a pad offset
+        self.zero_copy = True
+        self.metadata_copies_skipped = 0
+        self.__src_pad: "Gst.Pad" = None
+        self.__rebased = False
+
+        # buffers and bytes leaving the branch towards the webrtcbin
+        self.pad = gstapp.Pad()
+        self.pad.enable_data_count()
+
         # self._last_dts = 0
         self.logger = get_logger()
 
@@ -312,6 +343,15 @@ class Branch:
             self._appsink.on_pulled_sample += self.on_pulled_sample
 
     def on_pulled_sample(self, _sample: "Gst.Sample"):
+        if self.zero_copy:
+            if self.appsrc:
+                if not self.__rebased:
+                    self.__rebase(_sample.get_buffer())
+                self.metadata_copies_skipped += 1
+                Branch.total_metadata_copies_skipped += 1
+                self.appsrc.push_sample(_sample)
+            return
+
         _buffer: "Gst.Buffer" = _sample.get_buffer()
         buffer: "Gst.Buffer" = _buffer.copy()
         # buffer: "Gst.Buffer" = _buffer.copy_deep()
@@ -324,6 +364,15 @@ class Branch:
         if self.appsrc:
             self.appsrc.push_sample(sample)
 
+    def __rebase(self, buffer: "Gst.Buffer"):
+        # the upstream buffer is shared between viewers and must not be written,
+        # map its timestamps onto this pipeline running time once, on the appsrc pad
+        pts = buffer.pts if buffer.pts != Gst.CLOCK_TIME_NONE else 0
+        running_time = gstapp.get_running_time(self.bin) if self.bin else 0
+        if self.__src_pad != None:
+            self.__src_pad.set_offset(running_time - pts)
+        self.__rebased = True
+
     def __del__(self):
         self.clear()
         # self.logger.warning("del Branch", stacklevel=2)
@@ -332,11 +381,15 @@ class Branch:
         self.stop()
         self.appsink = None
         self.target = None
+        self.pad.clear()
 
     def stop(self):
+        self.pad.stop()
         if self.appsrc:
             self.appsrc.clear()
         self.appsrc = None
+        self.__src_pad = None
+        self.__rebased = False
         if self.bin:
             if self.target != None:
                 self.bin.unlink(self.target)
@@ -354,8 +407,7 @@ class Branch:
     #     # self.logger.info(f"{buffer.dts}, {buffer.pts}")
     #     return Gst.PadProbeReturn.OK
 
-    def start(self, target: "Gst.Element"):
-        self.stop()
+    def pipe(self) -> "str":
         pipe = ""
         pipe += gstapp.Pipe.appsrc("appsrc")
         # pipe += " ! "
@@ -364,16 +416,195 @@ class Branch:
 
         # pipe += "h264parse config-interval=-1 ! "
         # pipe += "rtph264pay name=pay0 config-interval=-1"
+        pipe += self.pipe_tail
+        return pipe
 
-        self.logger.bin(pipe)
-        self.bin: "Gst.Bin" = Gst.parse_bin_from_description(pipe, True)
+    def start(self, target: "Gst.Element", bin: "Gst.Bin" = None):
+        """
+        bin - built from pipe() and already linked to target, see ViewerPool
+        """
+        self.stop()
+        if bin == None:
+            pipe = self.pipe()
+            self.logger.bin(pipe)
+            self.bin: "Gst.Bin" = Gst.parse_bin_from_description(pipe, True)
+        else:
+            self.bin = bin
         # self.bin.get_by_name("pay0").get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.h264parse_restamp_probe)
         self.appsrc = gstapp.AppSrc(self.bin.get_by_name("appsrc"))
+        self.__src_pad = self.appsrc.appsrc.get_static_pad("src")
+        self.pad.start(self.bin.get_static_pad("src"))
+        if bin == None:
+            pipeline: "Gst.Bin" = target.parent
+            pipeline.add(self.bin)
+            self.bin.link(target)
+        self.bin.sync_state_with_parent()
+        # self.appsrc.appsink = self.appsink
+
+
+class TeeBranch:
+    """
+    fan-out branch, links a leaky queue from a tee living in the same pipeline as the target,
+    so packets never leave the streaming threads
+    """
+
+    def __init__(self):
+        self.tee: "Gst.Element" = None
+        self.bin: "Gst.Bin" = None
+        self.target: "Gst.Element" = None
+        self.max_size_buffers = 200
+        self.queue: "Gst.Element" = None
+        self.unlink_timeout = 1.0  # sec
+
+        self.pad = gstapp.Pad()
+        self.pad.enable_data_count()
+
+        self.__tee_pad: "Gst.Pad" = None
+        self.logger = get_logger()
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+        self.tee = None
+        self.pad.clear()
+
+    @property
+    def queue_level(self) -> "int":
+        if self.queue == None:
+            return 0
+        return self.queue.get_property("current-level-buffers")
+
+    def __unlink_tee_pad(self):
+        # from an idle probe, the tee is not pushing on the pad while it is unlinked
+        unlinked = threading.Event()
+
+        def _on_idle(pad: "Gst.Pad", info: "Gst.PadProbeInfo", user_data=None):
+            peer: "Gst.Pad" = pad.get_peer()
+            if peer != None:
+                pad.unlink(peer)
+            unlinked.set()
+            return Gst.PadProbeReturn.REMOVE
+        self.__tee_pad.add_probe(Gst.PadProbeType.IDLE, _on_idle)
+        # immediate when the pad is idle, else after the buffer in flight, the leaky queue never blocks it
+        if not unlinked.wait(self.unlink_timeout):
+            self.logger.warning("tee pad still busy, unlinking anyway")
+            peer: "Gst.Pad" = self.__tee_pad.get_peer()
+            if peer != None:
+                self.__tee_pad.unlink(peer)
+
+    def stop(self):
+        self.pad.stop()
+        if self.__tee_pad != None:
+            self.__unlink_tee_pad()
+            if self.tee != None:
+                self.tee.release_request_pad(self.__tee_pad)
+        self.__tee_pad = None
+        if self.bin:
+            # stop the queue task before unlinking, otherwise it posts not-linked on the camera bus
+            self.bin.set_state(Gst.State.NULL)
+            if self.target != None:
+                self.bin.unlink(self.target)
+            pipeline: "Gst.Bin" = self.bin.parent
+            if pipeline:
+                pipeline.remove(self.bin)
+        self.bin = None
+        self.queue = None
+        self.target = None
+
+    def start(self, target: "Gst.Element"):
+        self.stop()
+        pipe = f"queue name=queue max-size-buffers={self.max_size_buffers} max-size-bytes=0 max-size-time=0 leaky=downstream"
+        self.logger.bin(pipe)
+        self.bin: "Gst.Bin" = Gst.parse_bin_from_description(pipe, True)
+        self.queue = self.bin.get_by_name("queue")
+        self.pad.start(self.bin.get_static_pad("src"))
         pipeline: "Gst.Bin" = target.parent
         pipeline.add(self.bin)
         self.bin.link(target)
+        self.target = target
         self.bin.sync_state_with_parent()
-        # self.appsrc.appsink = self.appsink
+        self.__tee_pad = self.tee.get_request_pad("src_%u")
+        self.__tee_pad.link(self.bin.get_static_pad("sink"))
+        # the new viewer joins mid GOP, ask the encoder for a fresh IDR
+        self.__tee_pad.send_event(gstapp.force_key_unit_event())
+
+
+class RenditionBranch(Branch):
+    """
+    branch fed by one rendition of the camera encoding ladder,
+    payloads per viewer so switching rendition keeps ssrc and seqnum continuity
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pipe_tail = " ! rtph264pay config-interval=-1 pt=96"
+        self.rendition: "Rendition" = None
+        self.switches = 0
+        self.switched_at = 0.0  # monotonic time of the last switch request
+
+        self.__pending: "Rendition" = None
+        self.__lock = threading.Lock()
+        self.__handlers: "dict[Rendition, typing.Callable[[Gst.Sample],]]" = {}
+
+    def clear(self):
+        with self.__lock:
+            for rendition, handler in self.__handlers.items():
+                rendition.appsink.on_pulled_sample -= handler
+            self.__handlers.clear()
+            self.__pending = None
+            self.rendition = None
+        super().clear()
+
+    def __subscribe(self, rendition: "Rendition", is_new: "bool"):
+        def on_rendition_sample(sample: "Gst.Sample"):
+            # drops what is still in flight from the previous rendition
+            if self.rendition is rendition:
+                self.on_pulled_sample(sample)
+        self.__handlers[rendition] = on_rendition_sample
+        rendition.appsink.on_pulled_sample.append(on_rendition_sample, is_new)
+
+    def __unsubscribe(self, rendition: "Rendition"):
+        handler = self.__handlers.pop(rendition, None)
+        if handler != None:
+            rendition.appsink.on_pulled_sample -= handler
+
+    def switch(self, rendition: "Rendition"):
+        """
+        switch to rendition at its next key frame, the first call primes from its GOP cache
+        """
+        with self.__lock:
+            if self.__pending != None:
+                self.__pending.appsink.on_pulled_sample -= self.__on_pending_sample
+                self.__pending = None
+            if rendition == None or rendition is self.rendition:
+                return
+            if self.rendition == None:
+                self.rendition = rendition
+                self.__subscribe(rendition, True)
+                return
+            self.__pending = rendition
+            self.switched_at = time.monotonic()
+            rendition.appsink.on_pulled_sample.append(self.__on_pending_sample, False)
+        rendition.force_key_unit()
+
+    def __on_pending_sample(self, sample: "Gst.Sample"):
+        if sample.get_buffer().has_flags(Gst.BufferFlags.DELTA_UNIT):
+            return
+        with self.__lock:
+            pending = self.__pending
+            if pending == None:
+                return
+            pending.appsink.on_pulled_sample -= self.__on_pending_sample
+            self.__pending = None
+            previous = self.rendition
+            self.rendition = pending
+            self.__unsubscribe(previous)
+            self.__subscribe(pending, False)
+            self.switches += 1
+        self.logger.info(f"switched to rendition {pending.name}")
+        self.on_pulled_sample(sample)
 
 
 def get_sdp_type(data: typing.Any):
@@ -427,11 +658,287 @@ def sdp_to_dict(sdp: GstWebRTC.WebRTCSessionDescription) -> dict:
     }
 
 
-class Viewer:
+class BandwidthEstimator:
+    """
+    loss based send bitrate estimate from webrtcbin stats,
+    outbound-rtp tells what was sent and remote-inbound-rtp what the receiver lost
+    """
+
+    def __init__(self, bitrate: "float" = 2000000, min_bitrate: "float" = 150000, max_bitrate: "float" = 10000000) -> None:
+        self.bitrate = bitrate  # bit/s
+        self.min_bitrate = min_bitrate
+        self.max_bitrate = max_bitrate
+        self.loss = 0.0
+        self.throughput = 0.0  # bit/s
+        # growth cap, times the measured receive rate
+        self.received_headroom = 1.5
+        # bit/s the estimate may probe up to without loss whatever the receive rate, the next rendition up
+        self.probe_bitrate: "float" = None
+        self.updated = False
+
+        self.__timestamp: "float" = None
+        self.__bytes_sent = 0
+        self.__packets_sent = 0
+        self.__packets_lost = 0
+
+    def update(self, stats: "dict") -> "float":
+        bytes_sent = 0
+        packets_sent = 0
+        packets_lost = 0
+        for stat in stats.values():
+            if type(stat) != dict:
+                continue
+            _type = stat.get("type", None)
+            if _type == GstWebRTC.WebRTCStatsType.OUTBOUND_RTP:
+                bytes_sent += stat.get("bytes-sent", 0)
+                packets_sent += stat.get("packets-sent", 0)
+            elif _type == GstWebRTC.WebRTCStatsType.REMOTE_INBOUND_RTP:
+                packets_lost += max(stat.get("packets-lost", 0), 0)
+        now = time.monotonic()
+        if self.__timestamp != None:
+            dt = now - self.__timestamp
+            sent = packets_sent - self.__packets_sent
+            if dt > 0:
+                self.throughput = (bytes_sent - self.__bytes_sent) * 8 / dt
+            if sent > 0:
+                self.loss = min(max((packets_lost - self.__packets_lost) / sent, 0.0), 1.0)
+                if self.loss > 0.1:
+                    self.bitrate *= 1 - 0.5 * self.loss
+                elif self.loss < 0.02:
+                    # never past what the link delivers, with the 1.5x headroom of GCC
+                    # so an encoder sending at the estimate can still ramp up,
+                    # or past the probe target, a viewer on a low rendition receives little
+                    cap = self.received_headroom * self.throughput * (1 - self.loss)
+                    if self.probe_bitrate != None:
+                        cap = max(cap, self.probe_bitrate)
+                    # the cap only limits growth, without loss the estimate never goes down
+                    self.bitrate = max(self.bitrate, min(self.bitrate * 1.08, cap))
+                self.bitrate = min(max(self.bitrate, self.min_bitrate), self.max_bitrate)
+                self.updated = True
+        self.__timestamp = now
+        self.__bytes_sent = bytes_sent
+        self.__packets_sent = packets_sent
+        self.__packets_lost = packets_lost
+        return self.bitrate
+
+
+class BitrateController:
+    """
+    turns the viewers bandwidth estimates into the shared encoder bitrate,
+    or into per viewer rendition switches when the camera has a ladder, both rate limited
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False  # drive the single encoder bitrate
+        self.percentile = 0.0  # of the viewers estimates the shared encoder follows, 0 is the slowest viewer
+        self.hysteresis = 0.1  # relative change needed before acting
+        self.min_interval = 2.0  # sec between encoder bitrate changes
+        self.switch_interval = 4.0  # sec between renditions switches of one viewer
+
+        self.target_bitrate: "float" = None  # bit/s
+        self.decisions = 0
+        self.increases = 0
+        self.decreases = 0
+        self.rate_limited = 0
+        self.switches_up = 0
+        self.switches_down = 0
+
+        self.__changed_at = 0.0
+        self.__lock = threading.Lock()
+        self.logger = get_logger()
+
+    def metrics(self) -> "dict":
+        return {
+            "target_bitrate": self.target_bitrate or 0,
+            "decisions": self.decisions,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rate_limited": self.rate_limited,
+            "switches_up": self.switches_up,
+            "switches_down": self.switches_down,
+        }
+
+    def update_encoder(self, camera: "Camera", estimates: "list[float]"):
+        encoder = camera.encoder
+        if encoder == None or len(estimates) <= 0:
+            return
+        estimates = sorted(estimates)
+        target = estimates[min(int(len(estimates) * self.percentile), len(estimates) - 1)]
+        target = min(target, camera.max_bitrate * 1000)
+        current = encoder.get_property("bitrate") * 1000
+        change = (target - current) / current if current > 0 else 1.0
+        if abs(change) < self.hysteresis:
+            return
+        now = time.monotonic()
+        # back off quickly, ramp up slowly
+        interval = self.min_interval if change < 0 else 2 * self.min_interval
+        if now - self.__changed_at < interval:
+            self.rate_limited += 1
+            return
+        self.__changed_at = now
+        self.target_bitrate = target
+        self.decisions += 1
+        if change < 0:
+            self.decreases += 1
+        else:
+            self.increases += 1
+        self.logger.info(f"encoder bitrate {int(current / 1000)} -> {int(target / 1000)} kbit/s")
+        encoder.set_property("bitrate", max(int(target / 1000), 1))
+
+    def probe_bitrate(self, camera: "Camera", branch: "RenditionBranch") -> "float":
+        """
+        bit/s the estimate must reach to switch the branch one rendition up, None on the top one
+        """
+        current = branch.rendition
+        if current == None or current not in camera.renditions:
+            return None
+        index = camera.renditions.index(current)
+        if index <= 0:
+            return None
+        return camera.renditions[index - 1].bitrate * 1000 * (1 + self.hysteresis)
+
+    def select_rendition(self, camera: "Camera", bitrate: "float", branch: "RenditionBranch"):
+        current = branch.rendition
+        target = camera.select_rendition(bitrate)
+        if target == None or target is current:
+            return
+        now = time.monotonic()
+        with self.__lock:
+            up = current != None and target.bitrate > current.bitrate
+            if up and bitrate < target.bitrate * 1000 * (1 + self.hysteresis):
+                return
+            interval = self.switch_interval if up else self.switch_interval / 2
+            if now - branch.switched_at < interval:
+                self.rate_limited += 1
+                return
+            self.decisions += 1
+            if up:
+                self.switches_up += 1
+            else:
+                self.switches_down += 1
+        branch.switch(target)
+
+
+class SignalingOutbox:
+    """
+    hands signaling messages from the GLib thread to the websocket event loop,
+    consecutive ice candidates are coalesced into a single "ices" frame
+    """
+
     def __init__(self):
-        # self.websocket = websocket
         self.websocket: "WebsocketImplProtocol" = None
         self.event_loop: "asyncio.AbstractEventLoop" = None
+        self.delay = 0.005  # sec, lets a trickle-ice burst gather before flushing
+
+        self.messages_sent = 0
+        self.frames_sent = 0
+
+        self.__lock = threading.Lock()
+        self.__pending: "list[tuple[str, typing.Any]]" = []
+        self.__scheduled = False
+        self.__draining = False
+
+        self.logger = get_logger()
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+
+    def stop(self):
+        with self.__lock:
+            self.__pending = []
+            self.__scheduled = False
+        self.websocket = None
+        self.event_loop = None
+
+    def start(self, websocket: "WebsocketImplProtocol", event_loop: "asyncio.AbstractEventLoop"):
+        self.websocket = websocket
+        self.event_loop = event_loop
+        with self.__lock:
+            if len(self.__pending) <= 0 or self.__scheduled:
+                return
+            self.__scheduled = True
+        event_loop.call_soon_threadsafe(self.__schedule)
+
+    def post(self, _type: "str", data: "typing.Any"):
+        # thread safe, called from the GLib thread
+        with self.__lock:
+            self.__pending.append((_type, data))
+            event_loop = self.event_loop
+            if self.__scheduled or event_loop == None:
+                return
+            self.__scheduled = True
+        event_loop.call_soon_threadsafe(self.__schedule)
+
+    def __schedule(self):
+        event_loop = self.event_loop
+        if event_loop == None:  # stopped meanwhile
+            return
+        if self.delay > 0:
+            event_loop.call_later(self.delay, self.__flush)
+        else:
+            self.__flush()
+
+    def __flush(self):
+        event_loop = self.event_loop
+        if self.__draining or event_loop == None:
+            return
+        self.__draining = True
+        event_loop.create_task(self.__drain())
+
+    async def __drain(self):
+        try:
+            while True:
+                with self.__lock:
+                    pending = self.__pending
+                    self.__pending = []
+                    if len(pending) <= 0:
+                        self.__scheduled = False
+                        return
+                frames = self.__frames(pending)
+                websocket = self.websocket
+                if websocket == None:
+                    continue
+                for frame in frames:
+                    await websocket.send(frame)
+                self.messages_sent += len(pending)
+                self.frames_sent += len(frames)
+        except BaseException as e:
+            self.logger.exception(e)
+            with self.__lock:
+                self.__scheduled = False
+        finally:
+            self.__draining = False
+
+    @staticmethod
+    def __frames(pending: "list[tuple[str, typing.Any]]") -> "list[str]":
+        frames = []
+        ices = []
+
+        def flush_ices():
+            if len(ices) == 1:
+                frames.append(json.dumps({"type": "ice", "data": ices[0]}))
+            elif len(ices) > 1:
+                frames.append(json.dumps({"type": "ices", "data": list(ices)}))
+            ices.clear()
+
+        for _type, data in pending:
+            if _type == "ice":
+                ices.append(data)
+                continue
+            flush_ices()
+            frames.append(json.dumps({"type": _type, "data": data}))
+        flush_ices()
+        return frames
+
+
+class Viewer:
+    def __init__(self):
+        self.name = ""
+        self.outbox = SignalingOutbox()
+        self.bandwidth = BandwidthEstimator()
 
         self.pipeline = gstapp.Pipeline()
         self.webrtcbin = WebRTCBin()
@@ -444,6 +951,9 @@ class Viewer:
         self.__delayed_add_branch: "list[Branch]" = []
         self.__delayed_add_datachannel: "list[DataChannel]" = []
 
+        # set when the webrtcbin lives inside another pipeline (fan-out mode)
+        self.__parent: "Gst.Bin" = None
+
         self._logger: "Logger" = None
         self.logger = get_logger()
 
@@ -456,22 +966,50 @@ class Viewer:
         self._logger = logger
         self.webrtcbin.logger = logger
         self.pipeline.logger = logger
+        self.outbox.logger = logger
 
-    async def _send(self, *a, **kw):
-        # self.logger.debug(f"_send({a}, {kw})")
-        try:
-            if self.websocket != None:
-                await self.websocket.send(*a, **kw)
-            # self.websocket.send(*a, **kw)
-        except BaseException as e:
-            self.logger.exception(e)
+    @property
+    def websocket(self):
+        return self.outbox.websocket
+
+    @property
+    def event_loop(self):
+        return self.outbox.event_loop
+
+    def connect(self, websocket: "WebsocketImplProtocol", event_loop: "asyncio.AbstractEventLoop"):
+        self.outbox.start(websocket, event_loop)
+
+    def send(self, _type: "str", data: "typing.Any"):
+        self.outbox.post(_type, data)
+
+    def close(self):
+        """
+        closes the websocket from any thread, handle() then cleans the viewer up
+        """
+        websocket = self.websocket
+        event_loop = self.event_loop
+        if websocket != None and event_loop != None:
+            asyncio.run_coroutine_threadsafe(websocket.close(), event_loop)
+
+    def owns(self, element: "Gst.Element") -> "bool":
+        """
+        whether element is this viewer webrtcbin or in one of its branch bins, or inside them
+        """
+        parts = [self.webrtcbin.webrtcbin] + [branch.bin for branch in self.branches]
+        parts = [part for part in parts if part != None]
+        while element != None:
+            if any(element == part for part in parts):
+                return True
+            element = element.get_parent()
+        return False
 
-    def send(self, *a, **kw):
-        # self.logger.debug(f"send({a}, {kw})")
-        asyncio.run(self._send(*a, **kw))
-        # async def _send(): await
-        # self.event_loop.call_soon(lambda: self._send(*a, **kw))
-        # asyncio.run_coroutine_threadsafe(self._send(*a, **kw), self.event_loop)
+    @property
+    def bytes_sent(self) -> "int":
+        return sum(branch.pad.data_bytes for branch in self.branches)
+
+    @property
+    def packets_sent(self) -> "int":
+        return sum(branch.pad.data_count for branch in self.branches)
 
     def __del__(self):
         self.clear()
@@ -486,7 +1024,7 @@ class Viewer:
             datachannel.clear()
         self.__delayed_add_datachannel.clear()
         self.webrtcbin.clear()
-        self.websocket = None
+        self.outbox.clear()
 
     def stop(self):
         for branch in self.branches:
@@ -499,31 +1037,59 @@ class Viewer:
             datachannel = None
         self.datachannels.clear()
         # self.datachannels = {}
+        webrtcbin = self.webrtcbin.webrtcbin
         self.webrtcbin.stop()
+        if self.__parent != None:
+            if webrtcbin != None:
+                webrtcbin.set_state(Gst.State.NULL)
+                self.__parent.remove(webrtcbin)
+            self.__parent = None
         self.pipeline.stop()
 
-    def start(self):
+    def start(self, parent: "Gst.Bin" = None, prebuilt: "PooledViewer" = None):
+        """
+        parent - when given, the webrtcbin is added to it instead of owning a pipeline
+        prebuilt - READY pipeline from a ViewerPool, its bin goes to the first branch
+        """
         self.stop()
-        # self.pipeline.parse_launch("webrtcbin name=webrtcbin latency=0 stun-server=\"stun://l.google.com:19302\"")
-        self.pipeline.parse_launch("webrtcbin name=webrtcbin latency=0")
-        self.webrtcbin.start(self.pipeline.pipeline.get_by_name("webrtcbin"))
+        if prebuilt != None:
+            self.pipeline.own(prebuilt.pipeline)
+            self.webrtcbin.start(prebuilt.pipeline.get_by_name("webrtcbin"))
+            if len(self.__delayed_add_branch) > 0:
+                self.__add_branch(self.__delayed_add_branch.pop(0), prebuilt.bin)
+        elif parent == None:
+            # self.pipeline.parse_launch("webrtcbin name=webrtcbin latency=0 stun-server=\"stun://l.google.com:19302\"")
+            self.pipeline.parse_launch("webrtcbin name=webrtcbin latency=0")
+            self.webrtcbin.start(self.pipeline.pipeline.get_by_name("webrtcbin"))
+        else:
+            webrtcbin: "Gst.Element" = Gst.ElementFactory.make("webrtcbin", None)
+            webrtcbin.set_property("latency", 0)
+            parent.add(webrtcbin)
+            self.__parent = parent
+            self.webrtcbin.start(webrtcbin)
         for branch in self.__delayed_add_branch:
             self.__add_branch(branch)
             branch = None
         self.__delayed_add_branch.clear()
-        ret = self.pipeline.play()
+        if parent == None:
+            ret = self.pipeline.play()
+        else:
+            ret = self.webrtcbin.webrtcbin.sync_state_with_parent()
         for datachannel in self.__delayed_add_datachannel:
             self.__add_datachannel(datachannel)
             datachannel = None
         self.__delayed_add_datachannel.clear()
         # self.webrtcbin.on_negotiation_needed()
 
-    def __add_branch(self, branch: "Branch"):
-        branch.start(self.webrtcbin.webrtcbin)
+    def __add_branch(self, branch: "Branch | TeeBranch", bin: "Gst.Bin" = None):
+        if bin != None:
+            branch.start(self.webrtcbin.webrtcbin, bin)
+        else:
+            branch.start(self.webrtcbin.webrtcbin)
         self.branches.append(branch)
 
-    def add_branch(self, branch: "Branch"):
-        if self.pipeline.pipeline != None:
+    def add_branch(self, branch: "Branch | TeeBranch"):
+        if self.webrtcbin.webrtcbin != None:
             self.__add_branch(branch)
         else:
             self.__delayed_add_branch.append(branch)
@@ -533,27 +1099,21 @@ class Viewer:
         self.datachannels[datachannel.name] = datachannel
 
     def add_datachannel(self, datachannel: "DataChannel"):
-        if self.pipeline.pipeline != None:
+        if self.webrtcbin.webrtcbin != None:
             self.__add_datachannel(datachannel)
         else:
             self.__delayed_add_datachannel.append(datachannel)
 
     def on_set_local_description(self, sdp: "GstWebRTC.WebRTCSessionDescription"):
         self.logger.debug(f"on_set_local_description: {sdp}")
-        self.send(json.dumps({
-            "type": "sdp",
-            "data": sdp_to_dict(sdp)
-        }))
+        self.send("sdp", sdp_to_dict(sdp))
 
     def on_ice_candidate(self, sdpMLineIndex: "int", candidate: "str"):
         self.logger.debug(f"on_ice_candidate: {sdpMLineIndex}, {candidate}")
-        self.send(json.dumps({
-            "type": "ice",
-            "data": {
-                "sdpMLineIndex": sdpMLineIndex,
-                "candidate": candidate,
-            }
-        }))
+        self.send("ice", {
+            "sdpMLineIndex": sdpMLineIndex,
+            "candidate": candidate,
+        })
 
     def handle(self, message):
         try:
@@ -595,6 +1155,109 @@ class Viewer:
         # self.webrtcbin.on_negotiation_needed()
 
 
+class PooledViewer:
+    def __init__(self, pipeline: "Gst.Pipeline", bin: "Gst.Bin", description: "str") -> None:
+        self.pipeline = pipeline
+        self.bin = bin
+        self.description = description
+
+
+class ViewerPool:
+    """
+    webrtcbin pipelines with their branch bin linked, built and set to READY ahead of the joins,
+    topped up one per idle callback of the main loop
+    """
+
+    def __init__(self, size: "int" = 0) -> None:
+        self.size = size
+        # branch bin description of the pooled pipelines, Branch.pipe()
+        self.description: "str" = None
+        self.hits = 0
+        self.misses = 0
+
+        self.__ready: "list[PooledViewer]" = []
+        self.__lock = threading.Lock()
+        self.__idle_id: "int" = None
+        self.logger = get_logger()
+
+    def __del__(self):
+        self.clear()
+
+    @property
+    def ready(self) -> "int":
+        return len(self.__ready)
+
+    def clear(self):
+        self.stop()
+
+    def stop(self):
+        with self.__lock:
+            if self.__idle_id != None:
+                GLib.source_remove(self.__idle_id)
+            self.__idle_id = None
+            ready = self.__ready
+            self.__ready = []
+            self.description = None
+        for pooled in ready:
+            pooled.pipeline.set_state(Gst.State.NULL)
+
+    def start(self, description: "str"):
+        self.stop()
+        self.description = description
+        self.__schedule()
+
+    def __schedule(self):
+        with self.__lock:
+            if self.__idle_id != None or self.description == None or len(self.__ready) >= self.size:
+                return
+            self.__idle_id = GLib.idle_add(self.__on_idle)
+
+    def build(self, description: "str") -> "PooledViewer":
+        pipeline: "Gst.Pipeline" = Gst.Pipeline.new()
+        webrtcbin: "Gst.Element" = Gst.ElementFactory.make("webrtcbin", "webrtcbin")
+        webrtcbin.set_property("latency", 0)
+        pipeline.add(webrtcbin)
+        bin: "Gst.Bin" = Gst.parse_bin_from_description(description, True)
+        pipeline.add(bin)
+        bin.link(webrtcbin)
+        pipeline.set_state(Gst.State.READY)
+        return PooledViewer(pipeline, bin, description)
+
+    def __on_idle(self, user_data=None):
+        description = self.description
+        try:
+            pooled = self.build(description)
+        except BaseException as e:
+            self.logger.exception(e)
+            pooled = None
+        with self.__lock:
+            if pooled != None and description == self.description and len(self.__ready) < self.size:
+                self.__ready.append(pooled)
+                pooled = None
+            more = self.description != None and len(self.__ready) < self.size
+            if not more:
+                self.__idle_id = None
+        if pooled != None:
+            pooled.pipeline.set_state(Gst.State.NULL)
+        return more
+
+    def take(self, description: "str") -> "PooledViewer":
+        """
+        a READY pipeline for a branch built from description, None when the pool is empty
+        """
+        if self.size <= 0:
+            return None
+        pooled = None
+        with self.__lock:
+            if description == self.description and len(self.__ready) > 0:
+                pooled = self.__ready.pop(0)
+                self.hits += 1
+            else:
+                self.misses += 1
+        self.__schedule()
+        return pooled
+
+
 class CameraToWebRTC:
     def __init__(self) -> None:
         self._camera: "Camera" = None
@@ -602,6 +1265,20 @@ class CameraToWebRTC:
         self.running_number = 0
         self.logger = get_logger()
 
+        # polls viewers stats, picks their rendition when the camera has a ladder,
+        # otherwise drives the shared encoder bitrate when the controller is enabled
+        self.stats_interval = 1000
+        self.__stats_timeout: "GLib.Source" = None
+        self.controller = BitrateController()
+
+        # encoder fps and bitrate, sampled on their own timer so a scrape only reads them
+        self.rate_interval = 1000
+        self.__rates_timeout: "GLib.Source" = None
+        self.__encoder_rates: "dict[str, tuple[Rate, Rate]]" = {}
+
+        # prebuilt viewer pipelines, appsink modes only, the fan-out webrtcbins live in the camera pipeline
+        self.pool = ViewerPool()
+
     @property
     def camera(self):
         return self._camera
@@ -613,13 +1290,202 @@ class CameraToWebRTC:
         current_viewers = list(self.__viewers)
         for viewer in current_viewers:
             self.remove(viewer)
+        if self._camera != None:
+            self._camera.on_start -= self.on_camera_start
+            self._camera.on_stop -= self.on_camera_stop
+            self._camera.pipeline.on_bus -= self.on_camera_bus
         self._camera = camera
+        self.__stop_stats()
+        self.__stop_rates()
+        self.pool.stop()
         if self._camera != None:
             self.logger = self._camera.logger
+            self.pool.logger = self.logger.sub("pool")
+            if not self._camera.fanout:
+                self.pool.start(self.__new_branch().pipe())
+            self._camera.on_start += self.on_camera_start
+            self._camera.on_stop += self.on_camera_stop
+            self._camera.pipeline.on_bus += self.on_camera_bus
+            if len(self._camera.renditions) > 0 or self.controller.enabled:
+                self.__start_stats()
+            self.__start_rates()
         for viewer in current_viewers:
             self.add(viewer)
         #     self._camera.webrtc_appsink += self.on_webrtc_appsink
 
+    @property
+    def metadata_copies_skipped(self):
+        return Branch.total_metadata_copies_skipped
+
+    def __new_branch(self) -> "Branch":
+        if len(self.camera.renditions) > 0:
+            return RenditionBranch()
+        return Branch()
+
+    def __stop_stats(self):
+        if self.__stats_timeout != None:
+            self.__stats_timeout.destroy()
+        self.__stats_timeout = None
+
+    def __start_stats(self):
+        self.__stats_timeout = GLib.timeout_source_new(self.stats_interval)
+        self.__stats_timeout.set_callback(self.__on_stats_timeout)
+        self.__stats_timeout.attach()
+
+    def __stop_rates(self):
+        if self.__rates_timeout != None:
+            self.__rates_timeout.destroy()
+        self.__rates_timeout = None
+        self.__encoder_rates = {}
+
+    def __start_rates(self):
+        self.__rates_timeout = GLib.timeout_source_new(self.rate_interval)
+        self.__rates_timeout.set_callback(self.__on_rates_timeout)
+        self.__rates_timeout.attach()
+
+    def __encoder_pads(self, camera: "Camera") -> "list[tuple[str, gstapp.Pad, Gst.Element]]":
+        encoders = [("main", camera.encoder_pad, camera.encoder)]
+        encoders += [(rendition.name, rendition.pad, rendition.encoder) for rendition in camera.renditions]
+        return encoders
+
+    def __on_rates_timeout(self, user_data=None):
+        camera = self.camera
+        if camera == None:
+            return True
+        for name, pad, encoder in self.__encoder_pads(camera):
+            if pad.pad == None:
+                continue
+            frame_rate, bit_rate = self.__encoder_rates.setdefault(name, (Rate(), Rate()))
+            frame_rate.update(pad.data_count)
+            bit_rate.update(pad.data_bytes)
+        return True
+
+    def __on_stats_timeout(self, user_data=None):
+        camera = self.camera
+        if camera != None and len(camera.renditions) <= 0 and self.controller.enabled:
+            # estimates are from the previous poll, stats replies are asynchronous
+            estimates = [viewer.bandwidth.bitrate for viewer in self.__viewers if viewer.bandwidth.updated]
+            self.controller.update_encoder(camera, estimates)
+        for viewer in self.__viewers:
+            if viewer.webrtcbin.webrtcbin == None:
+                continue
+            viewer.webrtcbin.get_stats(functools.partial(self.on_viewer_stats, viewer))
+        return True
+
+    def on_viewer_stats(self, viewer: "Viewer", stats: "dict"):
+        camera = self.camera
+        if camera == None or len(camera.renditions) <= 0:
+            viewer.bandwidth.update(stats)
+            return
+        probes = [self.controller.probe_bitrate(camera, branch) for branch in viewer.branches if isinstance(branch, RenditionBranch)]
+        probes = [probe for probe in probes if probe != None]
+        viewer.bandwidth.probe_bitrate = max(probes) if len(probes) > 0 else None
+        viewer.bandwidth.update(stats)
+        for branch in viewer.branches:
+            if isinstance(branch, RenditionBranch):
+                self.controller.select_rendition(camera, viewer.bandwidth.bitrate, branch)
+
+    def on_camera_stop(self):
+        # in fan-out mode the webrtcbins live in the camera pipeline and go down with it
+        if not self.camera.fanout:
+            return
+        for viewer in self.__viewers:
+            viewer.stop()
+
+    def on_camera_bus(self, message: "Gst.Message"):
+        # fan-out viewers live in the camera pipeline, a DTLS/ICE error of one must not restart the camera
+        if message.type != Gst.MessageType.ERROR or not self.camera.fanout:
+            return
+        viewer = next((viewer for viewer in self.__viewers if viewer.owns(message.src)), None)
+        if viewer == None:
+            return
+        err, debug = message.parse_error()
+        viewer.logger.error(f"{err}: {debug}, dropping the viewer")
+        self.camera.ignore_error()
+        self.remove(viewer)
+        viewer.close()
+
+    def on_camera_start(self):
+        if not self.camera.fanout:
+            return
+        for viewer in list(self.__viewers):
+            self.add(viewer)
+
+    def collect_metrics(self) -> "list[Metric]":
+        """
+        only reads counters kept by pad probes and the viewers, never walks the pipeline
+        """
+        camera = self.camera
+        state = Metric("camera_pipeline_state", "gauge", "camera pipeline state, 0 pending 1 null 2 ready 3 paused 4 playing")
+        restarts = Metric("camera_restarts_total", "counter", "camera pipeline restarts after an error or eos")
+        frames = Metric("encoder_frames_total", "counter", "encoded frames")
+        _bytes = Metric("encoder_bytes_total", "counter", "encoded bytes")
+        fps = Metric("encoder_fps", "gauge", "encoded frames per second over the last rate interval")
+        bitrate = Metric("encoder_bitrate_bps", "gauge", "encoded bit/s over the last rate interval")
+        target_bitrate = Metric("encoder_target_bitrate_kbps", "gauge", "encoder bitrate property")
+        jitter = Metric("encoder_jitter_seconds", "gauge", "encoder output inter-arrival jitter against the pts")
+        keyframe_interval = Metric("encoder_keyframe_interval_seconds", "gauge", "pts distance between the last two keyframes")
+        latency = Metric("encoder_latency_seconds", "gauge", "clock running time minus buffer running time at the encoder output")
+        metrics = [state, restarts, frames, _bytes, fps, bitrate, target_bitrate, jitter, keyframe_interval, latency]
+        if camera != None:
+            pipeline = camera.pipeline.pipeline
+            state.add(int(pipeline.get_state(0)[1]) if pipeline != None else int(Gst.State.NULL))
+            restarts.add(camera.restarts)
+            encoder_rates = self.__encoder_rates
+            for name, pad, encoder in self.__encoder_pads(camera):
+                if pad.pad == None:
+                    continue
+                frames.add(pad.data_count, encoder=name)
+                _bytes.add(pad.data_bytes, encoder=name)
+                rates = encoder_rates.get(name, None)
+                if rates != None:
+                    fps.add(rates[0].rate, encoder=name)
+                    bitrate.add(8 * rates[1].rate, encoder=name)
+                if encoder != None:
+                    target_bitrate.add(encoder.get_property("bitrate"), encoder=name)
+                stats = pad.stats
+                jitter.add(stats.jitter / Gst.SECOND, encoder=name)
+                if stats.keyframe_interval != None:
+                    keyframe_interval.add(stats.keyframe_interval / Gst.SECOND, encoder=name)
+                if stats.latency != None:
+                    latency.add(stats.latency / Gst.SECOND, encoder=name)
+
+        qos_dropped = Metric("qos_dropped_total", "counter", "buffers dropped by an element for qos, WEBRTC_SYNC_BUS=1 only")
+        qos_jitter = Metric("qos_jitter_seconds", "gauge", "jitter of the last qos message of an element")
+        metrics += [qos_dropped, qos_jitter]
+        if camera != None:
+            for name, qos in camera.pipeline.qos.items():
+                qos_dropped.add(qos.dropped, element=name)
+                qos_jitter.add(qos.jitter / Gst.SECOND, element=name)
+
+        viewers = list(self.__viewers)
+        metrics.append(Metric("viewers", "gauge", "viewers attached").add(len(viewers)))
+        bytes_sent = Metric("viewer_bytes_sent_total", "counter", "bytes handed to the viewer webrtcbin")
+        packets_sent = Metric("viewer_packets_sent_total", "counter", "buffers handed to the viewer webrtcbin")
+        queue_level = Metric("viewer_queue_level_buffers", "gauge", "fan-out queue fill level")
+        estimate = Metric("viewer_bandwidth_estimate_bps", "gauge", "loss based send bitrate estimate")
+        signaling = Metric("viewer_signaling_messages_total", "counter", "signaling messages sent")
+        metrics += [bytes_sent, packets_sent, queue_level, estimate, signaling]
+        for viewer in viewers:
+            bytes_sent.add(viewer.bytes_sent, viewer=viewer.name)
+            packets_sent.add(viewer.packets_sent, viewer=viewer.name)
+            signaling.add(viewer.outbox.messages_sent, viewer=viewer.name)
+            if viewer.bandwidth.updated:
+                estimate.add(viewer.bandwidth.bitrate, viewer=viewer.name)
+            for branch in viewer.branches:
+                if isinstance(branch, TeeBranch):
+                    queue_level.add(branch.queue_level, viewer=viewer.name)
+
+        metrics.append(Metric("viewer_pool_hits_total", "counter", "joins served from a prebuilt pipeline").add(self.pool.hits))
+        metrics.append(Metric("viewer_pool_misses_total", "counter", "joins that built their pipeline").add(self.pool.misses))
+        metrics.append(Metric("viewer_pool_ready", "gauge", "prebuilt pipelines waiting").add(self.pool.ready))
+        metrics.append(Metric("buffer_metadata_copies_skipped_total", "counter", "samples pushed to viewers as is instead of through Gst.Buffer.copy(), the memory is shared either way").add(self.metadata_copies_skipped))
+        for name, value in self.controller.metrics().items():
+            kind = "gauge" if name == "target_bitrate" else "counter"
+            name = f"controller_{name}" if kind == "gauge" else f"controller_{name}_total"
+            metrics.append(Metric(name, kind).add(value))
+        return metrics
+
     def remove(self, viewer: Viewer):
         try:
             self.__viewers.remove(viewer)
@@ -633,8 +1499,25 @@ class CameraToWebRTC:
         self.remove(viewer)
         self.__viewers.append(viewer)
         try:
-            branch = Branch()
+            if self.camera.fanout:
+                if self.camera.webrtc_tee == None:
+                    # started from on_camera_start once the camera pipeline is up
+                    viewer.logger.info("waiting for the camera pipeline")
+                    return
+                branch = TeeBranch()
+                branch.logger = viewer.logger.sub("video")
+                branch.tee = self.camera.webrtc_tee
+                viewer.add_branch(branch)
+                viewer.start(self.camera.pipeline.pipeline)
+                return
+            branch = self.__new_branch()
             branch.logger = viewer.logger.sub("video")
+            prebuilt = self.pool.take(branch.pipe())
+            if isinstance(branch, RenditionBranch):
+                branch.switch(self.camera.select_rendition(viewer.bandwidth.bitrate))
+                viewer.add_branch(branch)
+                viewer.start(prebuilt=prebuilt)
+                return
             branch.appsink = self.camera.webrtc_appsink
             viewer.add_branch(branch)
             # datachannel = DataChannelProtobuf()
@@ -643,15 +1526,15 @@ class CameraToWebRTC:
             # datachannel.as_text = True
             # datachannel.event = self.on_browser_message
             # viewer.add_datachannel(datachannel)
-            viewer.start()
+            viewer.start(prebuilt=prebuilt)
         except BaseException as ex:
             self.logger.exception(ex)
         
     async def handle(self, request, websocket: WebsocketImplProtocol):
         viewer = Viewer()
-        viewer.event_loop = asyncio.get_event_loop()
-        viewer.websocket = websocket
+        viewer.connect(websocket, asyncio.get_event_loop())
         running_number = self.running_number
+        viewer.name = f"{running_number}"
         viewer.logger = self.logger.sub(f"{running_number}")
         self.running_number += 1
         try:
@@ -666,14 +1549,87 @@ class CameraToWebRTC:
             pass
         except BaseException as e:
             self.logger.exception(e)
-        viewer.websocket = None
+        viewer.outbox.stop()
         # TODO consider implementing logger destructor
         self.remove(viewer)
         viewer.clear()
         viewer = None
 
 
+class Rendition:
+    def __init__(self, name: "str", width: "int", height: "int", bitrate: "int") -> None:
+        """
+        bitrate - kbit/s, as x264enc
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.bitrate = bitrate
+        self.encoder: "Gst.Element" = None
+        self.pad = gstapp.Pad()
+        self.pad.enable_data_count()
+        self.pad.enable_stats(0)
+
+        # au aligned h264, h264parse flags the delta units
+        self.appsink = gstapp.AppSink()
+        self.appsink.enable_auto_pull_gop(4 * 1024 * 1024, gstapp.GopCache.delta_unit_classify)
+
+    @staticmethod
+    def parse(spec: "str") -> "list[Rendition]":
+        """
+        "1920x1080@4000,1280x720@2000,640x360@600" -> renditions, highest bitrate first
+        """
+        renditions = []
+        for item in spec.split(","):
+            item = item.strip()
+            if item == "":
+                continue
+            size, bitrate = item.split("@")
+            width, height = size.split("x")
+            # names the encoder and appsink elements, unique per rung
+            name = f"{width}x{height}_{bitrate}"
+            if any(rendition.name == name for rendition in renditions):
+                raise ValueError(f"duplicate rendition {item}")
+            renditions.append(Rendition(name, int(width), int(height), int(bitrate)))
+        renditions.sort(key=lambda rendition: rendition.bitrate, reverse=True)
+        return renditions
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+        self.appsink.clear()
+        self.pad.clear()
+
+    def stop(self):
+        self.pad.stop()
+        self.appsink.stop()
+        self.encoder = None
+
+    def pipe(self, tee: "str") -> "str":
+        pipe = f"{tee}. ! queue max-size-buffers=1 leaky=downstream ! "
+        pipe += f"videoscale ! capsfilter caps=\"video/x-raw, width={self.width}, height={self.height}\" ! "
+        pipe += f"x264enc name=encoder_{self.name} tune=zerolatency key-int-max=30 bitrate={self.bitrate} ! "
+        pipe += "h264parse config-interval=-1 ! "
+        pipe += "capsfilter caps=\"video/x-h264, stream-format=byte-stream, alignment=au\" ! "
+        pipe += gstapp.Pipe.appsink(f"appsink_{self.name}")
+        return pipe
+
+    def start(self, pipeline: "Gst.Pipeline"):
+        self.encoder = pipeline.get_by_name(f"encoder_{self.name}")
+        self.pad.start(self.encoder.get_static_pad("src"))
+        self.appsink.start(pipeline.get_by_name(f"appsink_{self.name}"))
+
+    def force_key_unit(self):
+        if self.encoder != None:
+            self.encoder.get_static_pad("src").send_event(gstapp.force_key_unit_event())
+
+
 class Camera:
+    # switch_sources, leaves the cell as it is
+    KEEP = object()
+
     def __init__(self) -> None:
         self.pipeline = gstapp.Pipeline()
         self.pipeline.on_error += self.on_error
@@ -682,13 +1638,66 @@ class Camera:
         self.restart.on_restart += self.start
 
         self.webrtc_appsink = gstapp.AppSink()
-        self.webrtc_appsink.enable_auto_pull_ring(60)
-
+        # new viewers are primed from the last key frame, not from the middle of a GOP
+        self.webrtc_appsink.enable_auto_pull_gop(4 * 1024 * 1024)
+
+        # encoding ladder, highest bitrate first, empty for a single encoder
+        self.renditions: "list[Rendition]" = []
+
+        # single encoder, kbit/s, the bitrate controller never goes above it
+        self.max_bitrate = 2048
+        self.encoder: "Gst.Element" = None
+        # encoded frames and bytes, read by /metrics
+        self.encoder_pad = gstapp.Pad()
+        self.encoder_pad.enable_data_count()
+        self.encoder_pad.enable_stats(0)
+        self.restarts = 0
+        # set from on_bus when the error only concerns a part that was torn down, see ignore_error
+        self.__error_handled = False
+
+        # synthetic tiles instead of the outputs/ image sequences (benchmarks)
+        self.test_source = False
+
+        # tiles grid, sources are the outputs/ sequences
+        self.layout = gstapp.Layout(2, 4, 1920, 1080, sources=["00", "01", "02", "03", "10", "11", "12", "13"])
+
+        # one video decoded once and cut into the tiles inside the pipeline, instead of the outputs/ sequences
+        self.mosaic: "str" = None
+
+        # decode each image sequence once and loop the raw frames, 0 decodes from disk on every loop,
+        # load_frame_stores() blocks, call it before start(), never from the GLib loop
+        self.frame_cache_bytes = 0  # over all tiles
+        self.frame_cache_storage = gstapp.FrameStore.MEMORY
+        self.frame_cache_eviction = gstapp.FrameStore.TRUNCATE
+        self.frame_cache_directory: "str" = None
+        self.frame_stores: "list[gstapp.FrameStore]" = []
+
+        # pre-encoder raw composite for local consumers, "mmap:/dev/shm/webrtc_composite" ring file
+        # (gstapp.FrameRingReader, tiles are sliced from it) or "shm:/tmp/webrtc_composite" shmsink socket
+        self.raw_export: "str" = None
+        self.raw_export_format = "BGR"
+        self.raw_export_slots = 4
+        # shm only, one more shmsink per cell at {path}_{index}
+        self.raw_export_tiles = False
+        self.raw_appsink = gstapp.AppSink()
+        self.raw_appsink.enable_auto_pull()
+        self.frame_ring: "gstapp.FrameRing" = None
+
+        # fan-out mode, viewers webrtcbins are attached to webrtc_tee inside this pipeline
+        self.fanout = False
+        self.webrtc_tee: "Gst.Element" = None
+        self.on_start: "Event[typing.Callable[[],]]" = Event("on_start")
+        self.on_stop: "Event[typing.Callable[[],]]" = Event("on_stop")
+
+        # override the sources of the first four cells, file paths or uris
         self.uri: "str" = None
         self.uri2: "str" = None
         self.uri3: "str" = None
         self.uri4: "str" = None
 
+        # cell index -> bin linked to compositor sink_index, replaceable while playing
+        self.__sources: "dict[int, Gst.Bin]" = {}
+
         self._logger: "Logger" = None
         self.logger = get_logger()
 
@@ -702,6 +1711,14 @@ class Camera:
         self.restart.logger = logger
         self.pipeline.logger = logger
 
+    @property
+    def uris(self) -> "list[str]":
+        return [self.uri, self.uri2, self.uri3, self.uri4]
+
+    @uris.setter
+    def uris(self, uris: "list[str]"):
+        self.uri, self.uri2, self.uri3, self.uri4 = (list(uris) + [None] * 4)[:4]
+
     def __del__(self):
         self.clear()
         self.logger.warning("del Camera", stacklevel=2)
@@ -710,42 +1727,50 @@ class Camera:
         self.stop()
         self.restart.clear()
         self.webrtc_appsink.clear()
+        self.raw_appsink.clear()
+        for rendition in self.renditions:
+            rendition.clear()
+        self.encoder_pad.clear()
+        for store in self.frame_stores:
+            store.clear()
+        self.frame_stores = []
         self.pipeline.clear()
+        self.on_start.clear()
+        self.on_stop.clear()
 
     def stop(self):
         self.restart.stop()
+        if self.pipeline.pipeline != None:
+            self.on_stop()
         self.webrtc_appsink.stop()
+        self.raw_appsink.stop()
+        if self.frame_ring != None:
+            self.raw_appsink.on_pulled_sample -= self.frame_ring.write
+            self.frame_ring.clear()
+        self.frame_ring = None
+        for rendition in self.renditions:
+            rendition.stop()
+        self.encoder_pad.stop()
+        for store in self.frame_stores:
+            store.stop()
+        self.encoder = None
+        self.webrtc_tee = None
+        self.__sources.clear()
         self.pipeline.stop()
 
     def start(self):
         self.stop()
-        width = 480
-        height = 540
+        layout = self.layout
         pipe = ""
-        pipe += f"multifilesrc location=\"outputs/00/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_0 "
-        pipe += f"multifilesrc location=\"outputs/01/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_1 "
-        pipe += f"multifilesrc location=\"outputs/02/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_2 "
-        pipe += f"multifilesrc location=\"outputs/03/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_3 "
-        pipe += f"multifilesrc location=\"outputs/10/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_4 "
-        pipe += f"multifilesrc location=\"outputs/11/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_5 "
-        pipe += f"multifilesrc location=\"outputs/12/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_6 "
-        pipe += f"multifilesrc location=\"outputs/13/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin ! videoscale ! capsfilter caps=\"video/x-raw, width=660, height=530\" ! compositor.sink_7 "
-
-        #pipe += "compositor name=compositor "
-        #pipe += f"sink_0::xpos=0 sink_0::ypos=0 "
-        #pipe += f"sink_1::xpos=426 sink_1::ypos=0 "
-        #pipe += f"sink_2::xpos=0 sink_2::ypos=240 "
-        #pipe += f"sink_3::xpos=426 sink_3::ypos=240 ! "
-        
-        pipe += "compositor name=compositor "
-        pipe += f"sink_0::xpos={0 * width} sink_0::ypos={0 * height} "
-        pipe += f"sink_1::xpos={1 * width} sink_1::ypos={0 * height} "
-        pipe += f"sink_2::xpos={2 * width} sink_2::ypos={0 * height} "
-        pipe += f"sink_3::xpos={3 * width} sink_3::ypos={0 * height} "
-        pipe += f"sink_4::xpos={0 * width} sink_4::ypos={1 * height} "
-        pipe += f"sink_5::xpos={1 * width} sink_5::ypos={1 * height} "
-        pipe += f"sink_6::xpos={2 * width} sink_6::ypos={1 * height} "
-        pipe += f"sink_7::xpos={3 * width} sink_7::ypos={1 * height} ! "
+        # the compositor pads scale every source to its cell,
+        # the other modes link one source bin per cell once the pipeline is parsed
+        if self.mosaic != None:
+            pipe += self.mosaic_pipe()
+
+        pipe += f"{layout.pipe('compositor')} ! "
+        raw_export = self.raw_export_pipe()
+        if raw_export != "":
+            pipe += "tee name=raw ! queue max-size-buffers=2 ! "
 
         # pipe += "vp8enc ! "
         # pipe += " rtpvp8pay ! "
@@ -754,9 +1779,22 @@ class Camera:
         #### Run with H264
 
         pipe += "videoconvert ! capsfilter caps=\"video/x-raw, format=I420\" ! "
-        pipe += "videoscale ! capsfilter caps=\"video/x-raw, width=1920, height=1080\" ! "
 
-        pipe += "x264enc tune=zerolatency key-int-max=30 ! "
+        if len(self.renditions) > 0:
+            # encoding ladder, one encoder per rendition behind a tee
+            pipe += "tee name=ladder "
+            pipe += " ".join(rendition.pipe("ladder") for rendition in self.renditions)
+            pipe += raw_export
+            self.pipeline.parse_launch(pipe)
+            self.start_sources()
+            self.start_raw_export()
+            for rendition in self.renditions:
+                rendition.start(self.pipeline.pipeline)
+            self.pipeline.play()
+            self.on_start()
+            return
+
+        pipe += f"x264enc name=encoder tune=zerolatency key-int-max=30 bitrate={self.max_bitrate} ! "
         pipe += "h264parse config-interval=-1 ! "
         pipe += "rtph264pay config-interval=-1 pt=96 ! "
 
@@ -781,28 +1819,251 @@ class Camera:
         # pipe += "av1parse ! "
         # pipe += "rtpav1pay pt=96 ! "
         # pipe += "identity dump=true ! "
-        pipe += gstapp.Pipe.appsink("webrtc_appsink")
+        if self.fanout:
+            # fakesink keeps the pipeline clocked while no viewer is attached
+            pipe += "tee name=webrtc_tee allow-not-linked=true "
+            pipe += "webrtc_tee. ! queue max-size-buffers=1 leaky=downstream ! fakesink sync=true async=false"
+        else:
+            pipe += gstapp.Pipe.appsink("webrtc_appsink")
+        pipe += raw_export
 
         self.pipeline.parse_launch(pipe)
-        self.webrtc_appsink.start(self.pipeline.pipeline.get_by_name("webrtc_appsink"))
+        self.start_sources()
+        self.start_raw_export()
+        self.encoder = self.pipeline.pipeline.get_by_name("encoder")
+        self.encoder_pad.start(self.encoder.get_static_pad("src"))
+        if self.fanout:
+            self.webrtc_tee = self.pipeline.pipeline.get_by_name("webrtc_tee")
+        else:
+            self.webrtc_appsink.start(self.pipeline.pipeline.get_by_name("webrtc_appsink"))
         self.pipeline.play()
+        self.on_start()
+
+    def raw_export_pipe(self) -> "str":
+        """
+        branches of the raw tee, leaky so a slow consumer drops frames instead of holding the encoder
+        """
+        if self.raw_export == None:
+            return ""
+        layout = self.layout
+        kind, path = self.raw_export.split(":", 1)
+        convert = f"videoconvert ! capsfilter caps=\"video/x-raw, format={self.raw_export_format}\""
+        queue = "queue max-size-buffers=1 max-size-bytes=0 max-size-time=0 leaky=downstream"
+        if kind == "mmap":
+            return f" raw. ! {queue} ! {convert} ! appsink name=raw_appsink emit-signals=true sync=false async=false max-buffers=1 drop=true"
+        if kind != "shm":
+            raise ValueError(f"unknown raw export {self.raw_export}, mmap:<path> or shm:<path>")
+        # room for the slots of the largest 4 byte per pixel frame
+        shm_size = layout.width * layout.height * 4 * self.raw_export_slots
+        pipe = f" raw. ! {queue} ! {convert} ! shmsink socket-path=\"{path}\" shm-size={shm_size} wait-for-connection=false sync=false async=false"
+        if self.raw_export_tiles:
+            shm_size = layout.cell_width * layout.cell_height * 4 * self.raw_export_slots
+            for i in range(layout.size):
+                left, top, width, height = layout.cell(i)
+                right = layout.width - left - width
+                bottom = layout.height - top - height
+                pipe += f" raw. ! {queue} ! videocrop left={left} right={right} top={top} bottom={bottom} ! {convert} ! shmsink socket-path=\"{path}_{i}\" shm-size={shm_size} wait-for-connection=false sync=false async=false"
+        return pipe
+
+    def start_raw_export(self):
+        if self.raw_export == None or not self.raw_export.startswith("mmap:"):
+            return
+        self.frame_ring = gstapp.FrameRing(self.raw_export.split(":", 1)[1], self.raw_export_slots, self.layout.rows, self.layout.cols)
+        self.frame_ring.logger = self.logger.sub("raw")
+        self.raw_appsink.on_pulled_sample += self.frame_ring.write
+        self.raw_appsink.start(self.pipeline.pipeline.get_by_name("raw_appsink"))
+
+    def mosaic_pipe(self) -> "str":
+        """
+        the crop_video.py grid without the disk round trip, one decoder and a videocrop per cell of the layout
+        """
+        layout = self.layout
+        pipe = f"filesrc location=\"{self.mosaic}\" ! decodebin ! videoconvert ! "
+        # passthrough when the video already has the layout size
+        pipe += f"videoscale ! capsfilter caps=\"video/x-raw, width={layout.width}, height={layout.height}\" ! "
+        pipe += "tee name=mosaic "
+        for i in range(layout.size):
+            left, top, width, height = layout.cell(i)
+            right = layout.width - left - width
+            bottom = layout.height - top - height
+            pipe += f"mosaic. ! queue max-size-buffers=2 ! videocrop left={left} right={right} top={top} bottom={bottom} ! compositor.sink_{i} "
+        return pipe
+
+    def sequence_pipe(self, sequence: "str") -> "str":
+        return f"multifilesrc location=\"outputs/{sequence}/frame%d.png\" index=1 caps=\"image/png,framerate=30/1\" ! decodebin"
+
+    def source_pipe(self, index: "int") -> "str":
+        """
+        source bin of a cell, ending in a static pad the bin can ghost, None leaves the cell empty
+        """
+        layout = self.layout
+        uris = self.uris
+        uri = uris[index] if index < len(uris) else None
+        if uri != None:
+            if "://" not in uri:
+                uri = Gst.filename_to_uri(os.path.abspath(uri))
+            return f"uridecodebin uri=\"{uri}\" ! videoconvert"
+        if self.test_source:
+            return f"videotestsrc is-live=true pattern={index} ! capsfilter caps=\"video/x-raw, width={layout.cell_width}, height={layout.cell_height}, framerate=30/1\""
+        store = self.frame_stores[index] if index < len(self.frame_stores) else None
+        if store != None and store.loaded:
+            return store.pipe(f"frames_{index}")
+        if index < len(layout.sources):
+            return f"{self.sequence_pipe(layout.sources[index])} ! queue max-size-buffers=2"
+        return None
+
+    def start_sources(self):
+        compositor = self.pipeline.pipeline.get_by_name("compositor")
+        self.layout.apply(compositor)
+        if self.mosaic != None:
+            return
+        for i in range(self.layout.size):
+            self.__link_source(i, compositor, None)
+
+    def __link_source(self, index: "int", compositor: "Gst.Element", sink_pad: "Gst.Pad") -> "Gst.Bin":
+        pipe = self.source_pipe(index)
+        if pipe == None:
+            if sink_pad != None:
+                compositor.release_request_pad(sink_pad)
+            return None
+        self.logger.bin(pipe)
+        bin: "Gst.Bin" = Gst.parse_bin_from_description(pipe, True)
+        bin.set_name(f"source_{index}")
+        self.pipeline.pipeline.add(bin)
+        if sink_pad == None:
+            sink_pad = compositor.get_request_pad(f"sink_{index}")
+        src_pad: "Gst.Pad" = bin.get_static_pad("src")
+        # a file or image source starts at 0 while a live one (rtsp) already stamps the running time,
+        # the first buffer tells which and how far to move it
+        src_pad.add_probe(Gst.PadProbeType.BUFFER, self.__align_source, compositor)
+        src_pad.link(sink_pad)
+        if index < len(self.frame_stores) and self.frame_stores[index].loaded:
+            appsrc = bin.get_by_name(f"frames_{index}")
+            if appsrc != None:
+                self.frame_stores[index].start(appsrc)
+        self.__sources[index] = bin
+        bin.sync_state_with_parent()
+        return bin
+
+    def __align_source(self, pad: "Gst.Pad", info: "Gst.PadProbeInfo", compositor: "Gst.Element"):
+        buffer: "Gst.Buffer" = info.get_buffer()
+        if buffer == None or buffer.pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        running_time = buffer.pts
+        event: "Gst.Event" = pad.get_sticky_event(Gst.EventType.SEGMENT, 0)
+        if event != None:
+            segment: "Gst.Segment" = event.parse_segment()
+            running_time = segment.to_running_time(Gst.Format.TIME, buffer.pts)
+        if running_time != Gst.CLOCK_TIME_NONE:
+            offset = gstapp.get_running_time(compositor) - running_time
+            # live sources are already on time, only move the ones that are behind
+            if offset > 0:
+                pad.set_offset(offset)
+        return Gst.PadProbeReturn.REMOVE
+
+    def switch_source(self, index: "int") -> "bool":
+        """
+        replaces the source of cell index from the current uris, the compositor, encoder and viewers keep running
+        """
+        pipeline = self.pipeline.pipeline
+        if pipeline == None or self.mosaic != None:
+            return False
+        compositor = pipeline.get_by_name("compositor")
+        sink_pad: "Gst.Pad" = None
+        old = self.__sources.pop(index, None)
+        if old != None:
+            src_pad: "Gst.Pad" = old.get_static_pad("src")
+            sink_pad = src_pad.get_peer()
+            # stop the streaming threads before unlinking, an unlinked source posts not-linked
+            old.set_state(Gst.State.NULL)
+            if sink_pad != None:
+                src_pad.unlink(sink_pad)
+            pipeline.remove(old)
+        if index < len(self.frame_stores):
+            self.frame_stores[index].stop()
+        self.__link_source(index, compositor, sink_pad)
+        return True
+
+    def switch_sources(self, uris: "list[str]"):
+        """
+        uris - per cell, Camera.KEEP keeps the current source, None goes back to the image sequence,
+        applied at the next start when not playing
+        """
+        if self.mosaic != None:
+            self.logger.warning("the mosaic cells are cut from a single source and cannot be switched")
+            return
+        previous = self.uris
+        self.uris = [uri if uri is not Camera.KEEP else current for uri, current in zip(list(uris) + [Camera.KEEP] * 4, previous)]
+        changed = [i for i, (uri, current) in enumerate(zip(self.uris, previous)) if uri != current]
+        if len(changed) <= 0 or self.pipeline.pipeline == None:
+            return
+        for i in changed:
+            self.logger.info(f"switching cell {i} to {self.uris[i]}")
+            self.switch_source(i)
+        self.force_key_unit()
+
+    def force_key_unit(self):
+        if self.encoder != None:
+            self.encoder.get_static_pad("src").send_event(gstapp.force_key_unit_event())
+        for rendition in self.renditions:
+            rendition.force_key_unit()
+
+    def load_frame_stores(self):
+        """
+        decodes the sequences once, in parallel, the stores outlive pipeline restarts
+        """
+        layout = self.layout
+        sequences = layout.sources[:layout.size]
+        if self.frame_cache_bytes <= 0 or self.test_source or self.mosaic != None or len(self.frame_stores) > 0 or len(sequences) <= 0:
+            return
+        max_bytes = self.frame_cache_bytes // len(sequences)
+        threads: "list[threading.Thread]" = []
+        for sequence in sequences:
+            store = gstapp.FrameStore(max_bytes, self.frame_cache_storage, self.frame_cache_eviction, self.frame_cache_directory)
+            store.logger = self.logger.sub(f"frames_{sequence}")
+            # stored at the cell size, the compositor pad does not scale them again
+            pipe = f"{self.sequence_pipe(sequence)} ! videoconvert ! videoscale ! capsfilter caps=\"video/x-raw, format=I420, width={layout.cell_width}, height={layout.cell_height}\""
+            thread = threading.Thread(target=store.load, args=(pipe,), daemon=True)
+            thread.start()
+            threads.append(thread)
+            self.frame_stores.append(store)
+        for thread in threads:
+            thread.join()
+
+    def select_rendition(self, bitrate: "float") -> "Rendition":
+        """
+        bitrate - bit/s, highest rendition that fits, else the lowest
+        """
+        if len(self.renditions) <= 0:
+            return None
+        for rendition in self.renditions:
+            if rendition.bitrate * 1000 <= bitrate:
+                return rendition
+        return self.renditions[-1]
+
+    def ignore_error(self):
+        """
+        called from a pipeline on_bus handler, the error being dispatched does not restart the camera
+        """
+        self.__error_handled = True
 
     def on_error(self, err, debug):
+        if self.__error_handled:
+            self.__error_handled = False
+            return
+        self.restarts += 1
         self.restart.start(5000)
 
     def on_eos(self):
+        self.restarts += 1
         self.restart.start(100)
 
 
-def main():
-    # logger = load_package_logger(level=LOGGER.BIN)
-    logger = load_package_logger(level=logging.DEBUG)
-
-    main_loop = GLib.MainLoop()
-    glib_thread = threading.Thread(target=lambda: main_loop.run(), daemon=True)
-    glib_thread.start()
-
-    app = Sanic(__name__)
+def create_app(name=__name__, test_source=False) -> "tuple[Sanic, CameraToWebRTC]":
+    """
+    builds the sanic app and the camera, the GLib main loop must already run
+    """
+    app = Sanic(name)
     logging.getLogger("sanic.root").propagate = False
     logging.getLogger("sanic.error").propagate = False
     logging.getLogger("sanic.access").propagate = False
@@ -813,16 +2074,47 @@ def main():
     app.static("/", f"{Path()/ 'public' / 'index.html'}", name="index")
 
     camera_to_webrtc = CameraToWebRTC()
+    camera_to_webrtc.controller.enabled = os.environ.get("WEBRTC_CONGESTION_CONTROL", "0") == "1"
+    fanout = os.environ.get("WEBRTC_FANOUT", "0") == "1"
+    ladder = os.environ.get("WEBRTC_LADDER", "")
+    if fanout and Rendition.parse(ladder):
+        # the ladder pipeline has no webrtc_tee, fan-out viewers would never attach
+        raise ValueError("WEBRTC_FANOUT=1 and WEBRTC_LADDER can not be combined")
+    frame_cache = os.environ.get("WEBRTC_FRAME_CACHE", "")
+    mosaic = os.environ.get("WEBRTC_MOSAIC", None)
+    sync_bus = os.environ.get("WEBRTC_SYNC_BUS", "0") == "1"
+    camera_to_webrtc.pool.size = int(os.environ.get("WEBRTC_VIEWER_POOL", 0))
+    raw_export = os.environ.get("WEBRTC_RAW_EXPORT", None)
+    raw_export_tiles = os.environ.get("WEBRTC_RAW_EXPORT_TILES", "0") == "1"
+    layout_config = Config(logger=camera_to_webrtc.logger.sub("layout"))
+    if os.environ.get("WEBRTC_LAYOUT", "") != "":
+        layout_config.load(os.environ["WEBRTC_LAYOUT"])
 
     def switch_camera(file1, file2,file3, file4):
         if camera_to_webrtc.camera != None:
             camera_to_webrtc.camera.clear()
         camera = Camera()
+        if sync_bus:
+            camera.pipeline.enable_sync_bus()
+        camera.test_source = test_source
+        camera.fanout = fanout
+        camera.renditions = Rendition.parse(ladder)
+        camera.mosaic = mosaic
+        camera.raw_export = raw_export
+        camera.raw_export_tiles = raw_export_tiles
+        camera.layout = gstapp.Layout.from_config(layout_config, camera.layout)
+        if frame_cache != "":
+            camera.frame_cache_storage = frame_cache
+            camera.frame_cache_bytes = int(os.environ.get("WEBRTC_FRAME_CACHE_MB", 1024)) << 20
+            camera.frame_cache_eviction = os.environ.get("WEBRTC_FRAME_CACHE_EVICTION", gstapp.FrameStore.TRUNCATE)
+            camera.frame_cache_directory = os.environ.get("WEBRTC_FRAME_CACHE_DIR", None)
         camera.uri = file1
         camera.uri2 = file2
         camera.uri3 = file3
         camera.uri4 = file4
 
+        # decodes off the GLib loop, the restarts reuse the stores
+        camera.load_frame_stores()
         camera.start()
         camera_to_webrtc.camera = camera
 
@@ -830,18 +2122,57 @@ def main():
 
     @app.route("/rtsp", methods=["GET", "POST"])
     def api_rtsp(request: "request.Request"):
-        file1 = request.json["file1"]
-        file2 = request.json["file2"]
-        file3 = request.json["file3"]
-        file4 = request.json["file4"]
+        file1 = request.json.get("file1", None)
+        file2 = request.json.get("file2", None)
+        file3 = request.json.get("file3", None)
+        file4 = request.json.get("file4", None)
 
         print("file1:",file1) 
         print("file2:",file2)       
-        switch_camera(file1, file2, file3, file4)
+        if camera_to_webrtc.camera == None:
+            switch_camera(file1, file2, file3, file4)
+        else:
+            # swaps the compositor inputs, the viewers keep their session,
+            # a missing file keeps its cell, null puts the image sequence back
+            camera_to_webrtc.camera.switch_sources([request.json.get(key, Camera.KEEP) for key in ("file1", "file2", "file3", "file4")])
 
         return response.json({})
 
+    registry = Registry(prefix="webrtc_")
+    registry.add_collector(camera_to_webrtc.collect_metrics)
+
+    # per element cost from the GStreamer tracers, WEBRTC_TRACERS=1
+    tracers = TracerStats()
+    tracers.logger = camera_to_webrtc.logger.sub("tracers")
+    if tracers.enabled:
+        tracers.start()
+        registry.add_collector(tracers.collect_metrics)
+
+    @app.route("/tracers", methods=["GET", "DELETE"])
+    def api_tracers(request: "request.Request"):
+        if request.method == "DELETE":
+            tracers.reset()
+        camera = camera_to_webrtc.camera
+        pipeline = camera.pipeline.pipeline if camera != None else None
+        return response.json(tracers.snapshot(pipeline))
+
+    @app.route("/metrics", methods=["GET"])
+    def api_metrics(request: "request.Request"):
+        return response.text(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
     app.add_websocket_route(camera_to_webrtc.handle, "/ws")
+    return app, camera_to_webrtc
+
+
+def main():
+    # logger = load_package_logger(level=LOGGER.BIN)
+    logger = load_package_logger(level=logging.DEBUG)
+
+    main_loop = GLib.MainLoop()
+    glib_thread = threading.Thread(target=lambda: main_loop.run(), daemon=True)
+    glib_thread.start()
+
+    app, camera_to_webrtc = create_app()
 
     try:
         port = int(os.environ.get("PORT", 8080))
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 import asyncio
 import enum
+import fnmatch
 import functools
 import json
 import logging
@@ -9,6 +10,7 @@ import re
 import signal
 import sys
 import threading
+import time
 import typing
 from datetime import datetime
 from io import TextIOWrapper
@@ -631,9 +633,74 @@ class CameraToWebRTC:
         viewer = None
 
 
+class DeviceWatcher:
+    """
+    polls a directory for device nodes, on_added/on_removed fire from the GLib main loop
+    """
+
+    def __init__(self, directory: "str" = "/dev", pattern: "str" = "video*", interval: "int" = 1000) -> None:
+        self.directory = directory
+        self.pattern = pattern
+        self.interval = interval  # ms
+        self.devices: "set[str]" = set()
+
+        self.on_added: "Event[typing.Callable[[str],]]" = Event("on_added")
+        self.on_removed: "Event[typing.Callable[[str],]]" = Event("on_removed")
+
+        self.__timeout: "GLib.Source" = None
+        self.logger = get_logger()
+
+    def __del__(self):
+        self.clear()
+
+    def clear(self):
+        self.stop()
+        self.on_added.clear()
+        self.on_removed.clear()
+
+    def stop(self):
+        if self.__timeout != None:
+            self.__timeout.destroy()
+        self.__timeout = None
+        self.devices = set()
+
+    def start(self):
+        """
+        reports the devices already present right away
+        """
+        self.stop()
+        self.poll()
+        self.__timeout = GLib.timeout_source_new(self.interval)
+        self.__timeout.set_callback(self.__on_timeout)
+        self.__timeout.attach()
+
+    def __on_timeout(self, user_data=None):
+        self.poll()
+        return True
+
+    def poll(self):
+        try:
+            names = fnmatch.filter(os.listdir(self.directory), self.pattern)
+        except OSError as e:
+            self.logger.warning(f"{self.directory}: {e}")
+            names = []
+        devices = set(os.path.join(self.directory, name) for name in names)
+        removed = self.devices - devices
+        added = devices - self.devices
+        self.devices = devices
+        for device in sorted(removed):
+            self.logger.info(f"removed {device}")
+            self.on_removed(device)
+        for device in sorted(added):
+            self.logger.info(f"added {device}")
+            self.on_added(device)
+
+
 class Camera:
     def __init__(self) -> None:
         self.pipeline = gstapp.Pipeline()
+        # device errors are caught from on_bus, before on_error would restart the whole pipeline
+        self.pipeline.on_bus += self.on_bus
         self.pipeline.on_error += self.on_error
         self.pipeline.on_eos += self.on_eos
         self.restart = gstapp.RestartTimeout()
@@ -642,6 +709,18 @@ class Camera:
         self.webrtc_appsink = gstapp.AppSink()
         self.webrtc_appsink.enable_auto_pull_ring(60)
 
+        # 2x2 grid of 800x600 cells, a missing device leaves its cell empty
+        self.layout = gstapp.Layout(2, 2, 1600, 1200, sources=["/dev/video0", "/dev/video2", "/dev/video6", "/dev/video4"])
+
+        # devices come and go while the pipeline plays, each on the cell of its node name in layout.sources
+        self.watcher = DeviceWatcher()
+        self.watcher.on_added += self.add_device
+        self.watcher.on_removed += self.remove_device
+        self.retry_interval = 5.0  # sec before a device that failed is tried again
+        self.__devices: "dict[str, Gst.Bin]" = {}
+        self.__failed: "dict[str, float]" = {}
+        self.__error_handled = False
+
         self.uri: "str" = None
         self.uri2: "str" = None
         self.uri3: "str" = None
@@ -659,6 +738,7 @@ class Camera:
         self._logger = logger
         self.restart.logger = logger
         self.pipeline.logger = logger
+        self.watcher.logger = logger
 
     def __del__(self):
         self.clear()
@@ -667,48 +747,26 @@ class Camera:
     def clear(self):
         self.stop()
         self.restart.clear()
+        self.watcher.clear()
         self.webrtc_appsink.clear()
         self.pipeline.clear()
 
     def stop(self):
         self.restart.stop()
+        self.watcher.stop()
         self.webrtc_appsink.stop()
+        self.__devices.clear()
         self.pipeline.stop()
 
     def start(self):
         self.stop()
-        width = 800
-        height = 600
-
-        a = os.path.exists("/dev/video0") 
-        b = os.path.exists("/dev/video2")
-        c = os.path.exists("/dev/video4") 
-        d = os.path.exists("/dev/video6") 
+        layout = self.layout
         pipe = ""
 
-        if a:
-            pipe += f"v4l2src device=\"/dev/video0\" ! capsfilter caps=\"image/jpeg, width=800, height=600\" ! jpegdec ! videoscale method=0 add-borders=false ! videoconvert ! compositor.sink_0 "
-        if b:
-            pipe += f"v4l2src device=\"/dev/video2\" ! capsfilter caps=\"image/jpeg, width=800, height=600\" ! jpegdec ! videoscale method=0 add-borders=false ! videoconvert ! compositor.sink_1 "
-        if c:
-            pipe += f"v4l2src device=\"/dev/video4\" ! capsfilter caps=\"image/jpeg, width=800, height=600\" ! jpegdec ! videoscale method=0 add-borders=false ! videoconvert ! compositor.sink_2 "
-        if d:
-            pipe += f"v4l2src device=\"/dev/video6\" ! capsfilter caps=\"image/jpeg, width=800, height=600\" ! jpegdec ! videoscale method=0 add-borders=false ! videoconvert ! compositor.sink_3 "
-
-        pipe += "compositor name=compositor "
-        if a:
-            pipe += f" sink_0::xpos={0 * width} sink_0::ypos={0 * height}"
-        if b:
-            pipe += f" sink_1::xpos={1 * width} sink_1::ypos={0 * height}"
-        if c:
-            pipe += f" sink_2::xpos={1 * width} sink_2::ypos={1 * height}"
-        if d:
-        # pipe += f" sink_3::xpos={3 * width} sink_3::ypos={0 * height}"
-            pipe += f" sink_3::xpos={0 * width} sink_3::ypos={1 * height}"
-        # pipe += f" sink_5::xpos={1 * width} sink_5::ypos={1 * height}"
-        # pipe += f" sink_6::xpos={2 * width} sink_6::ypos={1 * height}"
-        # pipe += f" sink_7::xpos={3 * width} sink_7::ypos={1 * height}"
-        pipe += " ! "
+        # live background, the output keeps going with any number of cameras,
+        # the cameras are linked by the watcher, the compositor pads scale and convert them to their cell
+        pipe += f"{layout.background_pipe('compositor')} "
+        pipe += f"{layout.pipe('compositor')} ! "
 
 
         #### Run with H264
@@ -730,10 +788,83 @@ class Camera:
         pipe += gstapp.Pipe.appsink("webrtc_appsink")
 
         self.pipeline.parse_launch(pipe)
+        layout.apply(self.pipeline.pipeline.get_by_name("compositor"))
         self.webrtc_appsink.start(self.pipeline.pipeline.get_by_name("webrtc_appsink"))
+        self.watcher.start()
         self.pipeline.play()
 
+    def cell_of(self, device: "str") -> "int":
+        """
+        cell of the layout source with the device node name, layout sources are /dev paths
+        while the watcher may watch another directory (WEBRTC_DEVICE_DIR)
+        """
+        name = os.path.basename(device)
+        for index, source in enumerate(self.layout.sources[:self.layout.size]):
+            if os.path.basename(source) == name:
+                return index
+        return None
+
+    def add_device(self, device: "str"):
+        pipeline = self.pipeline.pipeline
+        if pipeline == None or device in self.__devices:
+            return
+        index = self.cell_of(device)
+        if index == None:
+            return
+        failed_at = self.__failed.get(device, None)
+        if failed_at != None and time.monotonic() - failed_at < self.retry_interval:
+            # reported again by a later poll
+            self.watcher.devices.discard(device)
+            return
+        pipe = f"v4l2src device=\"{device}\" ! capsfilter caps=\"image/jpeg, width=800, height=600\" ! jpegdec"
+        self.logger.bin(pipe)
+        bin: "Gst.Bin" = Gst.parse_bin_from_description(pipe, True)
+        bin.set_name(f"camera_{index}")
+        pipeline.add(bin)
+        compositor = pipeline.get_by_name("compositor")
+        bin.get_static_pad("src").link(compositor.get_request_pad(f"sink_{index}"))
+        self.__devices[device] = bin
+        bin.sync_state_with_parent()
+
+    def remove_device(self, device: "str"):
+        bin = self.__devices.pop(device, None)
+        pipeline = self.pipeline.pipeline
+        if bin == None or pipeline == None:
+            return
+        src_pad: "Gst.Pad" = bin.get_static_pad("src")
+        sink_pad: "Gst.Pad" = src_pad.get_peer()
+        bin.set_state(Gst.State.NULL)
+        if sink_pad != None:
+            src_pad.unlink(sink_pad)
+            pipeline.get_by_name("compositor").release_request_pad(sink_pad)
+        pipeline.remove(bin)
+
+    def __device_of(self, element: "Gst.Object") -> "str":
+        while element != None:
+            for device, bin in self.__devices.items():
+                if element == bin:
+                    return device
+            element = element.get_parent()
+        return None
+
+    def on_bus(self, message: "Gst.Message"):
+        if message.type != Gst.MessageType.ERROR:
+            return
+        device = self.__device_of(message.src)
+        if device == None:
+            return
+        # an unplugged or busy camera only loses its cell
+        self.logger.warning(f"{device} failed, removing it")
+        self.__error_handled = True
+        self.__failed[device] = time.monotonic()
+        self.remove_device(device)
+        # still listed while the node exists, retried by the next poll after retry_interval
+        self.watcher.devices.discard(device)
+
     def on_error(self, err, debug):
+        if self.__error_handled:
+            self.__error_handled = False
+            return
         self.restart.start(5000)
 
     def on_eos(self):
@@ -758,11 +889,17 @@ def main():
     app.static("/", f"{Path()/ 'public' / 'index.html'}", name="index")
 
     camera_to_webrtc = CameraToWebRTC()
+    layout_config = Config(logger=logger.sub("layout"))
+    if os.environ.get("WEBRTC_LAYOUT", "") != "":
+        layout_config.load(os.environ["WEBRTC_LAYOUT"])
+    device_directory = os.environ.get("WEBRTC_DEVICE_DIR", "/dev")
 
     def switch_camera(file1, file2,file3, file4):
         if camera_to_webrtc.camera != None:
             camera_to_webrtc.camera.clear()
         camera = Camera()
+        camera.layout = gstapp.Layout.from_config(layout_config, camera.layout)
+        camera.watcher.directory = device_directory
         camera.uri = file1
         camera.uri2 = file2
         camera.uri3 = file3